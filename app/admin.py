@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import Pitch, Category, PitchAnalytics, UserProfile, Claim, TweetBatch, ReplyOpportunity
+from .models import Pitch, Category, Mention, RelatedPitch, PitchAnalytics, UserProfile, Claim, TweetBatch, ReplyOpportunity
+from .utils.ranking_system import recompute_ranks
 
 @admin.register(Pitch)
 class PitchAdmin(admin.ModelAdmin):
@@ -69,7 +70,7 @@ class PitchAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
     
     # Custom actions
-    actions = ['mark_as_featured', 'mark_as_launched']
+    actions = ['mark_as_featured', 'mark_as_launched', 'recalculate_ranks']
     
     def view_analytics(self, obj):
         url = reverse('admin:app_pitchanalytics_change', args=[obj.analytics.id]) if hasattr(obj, 'analytics') else '#'
@@ -86,6 +87,11 @@ class PitchAdmin(admin.ModelAdmin):
         self.message_user(request, f'Marked {updated} pitches as launched.')
     mark_as_launched.short_description = 'Mark selected pitches as launched'
 
+    def recalculate_ranks(self, request, queryset):
+        updated = recompute_ranks(queryset)
+        self.message_user(request, f'Recalculated ranks for {updated} pitches.')
+    recalculate_ranks.short_description = 'Recalculate ranks for selected pitches'
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'is_active', 'created_at')
@@ -93,6 +99,19 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
 
+@admin.register(Mention)
+class MentionAdmin(admin.ModelAdmin):
+    list_display = ('pitch', 'handle', 'verified', 'posted_at', 'likes', 'views')
+    list_filter = ('verified', 'posted_at')
+    search_fields = ('handle', 'name', 'reply_link', 'pitch__name')
+    raw_id_fields = ('pitch',)
+
+@admin.register(RelatedPitch)
+class RelatedPitchAdmin(admin.ModelAdmin):
+    list_display = ('pitch', 'position', 'related', 'score', 'computed_at')
+    raw_id_fields = ('pitch', 'related')
+    search_fields = ('pitch__name',)
+
 @admin.register(PitchAnalytics)
 class PitchAnalyticsAdmin(admin.ModelAdmin):
     list_display = ('pitch', 'views_total', 'clicks_total', 'last_view', 'last_click')
@@ -1,26 +1,29 @@
 # context_processors.py
 # Create this file in your app directory (e.g., myapp/context_processors.py)
-from django_user_agents.utils import get_user_agent
-from .models import Category, Pitch
+from functools import lru_cache, partial
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from user_agents import parse
+
+from .utils.listings import cached_categories_with_pitches, cached_featured_pitches
 
 def categories_context(request):
     """
     Context processor to make categories available in all templates
     """
-    categories = (Category.objects
-                 .filter(pitches__isnull=False)
-                 .distinct()
-                 .order_by('name'))  # Optional: order categories alphabetically
-    
+    # Lazy: the cache is only read by templates that use categories
     return {
-        'categories': categories
+        'categories': SimpleLazyObject(cached_categories_with_pitches)
     }
     
-def device_context(request):
-    """
-    Context processor to make device information available in all templates
-    """
-    user_agent = get_user_agent(request)
+DEVICE_FIELDS = ('is_mobile', 'is_tablet', 'is_pc', 'is_touch_capable', 'browser', 'os', 'device')
+
+
+@lru_cache(maxsize=getattr(settings, 'DEVICE_CACHE_SIZE', 512))
+def parse_device(user_agent_string):
+    """Device fields for a raw User-Agent string, memoized across requests."""
+    user_agent = parse(user_agent_string)
     return {
         'is_mobile': user_agent.is_mobile,
         'is_tablet': user_agent.is_tablet,
@@ -31,12 +34,39 @@ def device_context(request):
         'device': user_agent.device.family,
     }
 
+
+def request_device(request):
+    """Parse the request's User-Agent at most once per request."""
+    device = getattr(request, '_device', None)
+    if device is None:
+        device = parse_device(request.META.get('HTTP_USER_AGENT', '')[:512])
+        request._device = device
+    return device
+
+
+def mobile_hint(request):
+    """The Sec-CH-UA-Mobile client hint as a bool, or None when absent or disabled."""
+    if not getattr(settings, 'DEVICE_USE_CLIENT_HINTS', True):
+        return None
+    return {'?1': True, '?0': False}.get(request.META.get('HTTP_SEC_CH_UA_MOBILE'))
+
+
+def device_context(request):
+    """
+    Context processor to make device information available in all templates
+    """
+    # Each field is lazy: the User-Agent is only parsed if a template reads one
+    context = {
+        field: SimpleLazyObject(partial(lambda field: request_device(request)[field], field))
+        for field in DEVICE_FIELDS
+    }
+    is_mobile = mobile_hint(request)
+    if is_mobile is not None:
+        context['is_mobile'] = is_mobile
+    return context
+
 # FEATURED PITCHES
 def featured_pitches_context(request):
-    featured_pitches = (Pitch.objects
-                       .filter(is_featured=True)
-                       .select_related('category')
-                       .order_by('-rank')[:2])
     return {
-        'featured_pitches': featured_pitches
+        'featured_pitches': SimpleLazyObject(cached_featured_pitches)
     }
@@ -2,14 +2,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Count, Sum, Avg
+from django.db.models import Q, Count, Sum, Avg, Exists, IntegerField, OuterRef, Value
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator
 from django.utils import timezone
 from datetime import datetime, timedelta
 import json
-from .models import Pitch, Category, PitchAnalytics, UserProfile, Claim
+from .models import Pitch, Category, Mention, PitchAnalytics, UserProfile, Claim
+from .utils.claim_matcher import match_claims
 
 @login_required
 def dashboard(request):
@@ -28,27 +31,17 @@ def dashboard(request):
     # Get suggested pitches (based on X handle mentions)
     suggested_pitches = []
     if profile.x_handle:
-        # print(profile.x_handle)
-        # Get all pitches that might contain the user's handle (case-insensitive)
-        potential_pitches = Pitch.objects.filter(
-            pitch_data__icontains=profile.x_handle
-        ).exclude(
-            claims__user=user
-        ).order_by('-rank')[:10]  # Get a few more in case some don't match exactly
-        # print(potential_pitches)
-
-        # Filter pitches where the handle is in the user.handle field of pitch_data
-        suggested_pitches = [
-            pitch for pitch in potential_pitches
-            if pitch.pitch_data and 
-            any(
-                isinstance(item, dict) and 
-                item.get('user', {}).get('handle', '').lower() == profile.x_handle.lower()
-                for item in (pitch.pitch_data if isinstance(pitch.pitch_data, list) else [pitch.pitch_data])
-            )
-        ]
+        # Pitches with a mention by the user's handle, via the indexed Mention.handle_lower
+        suggested_pitches = (Pitch.objects
+                             .filter(Exists(Mention.objects.filter(
+                                 pitch=OuterRef('pk'),
+                                 handle_lower=profile.x_handle.lower(),
+                             )))
+                             .exclude(claims__user=user)
+                             .select_related('category')
+                             .order_by('-rank')[:10])
     
-    claimed_pitches = Claim.objects.filter(user=user).order_by('claimed_at')
+    claimed_pitches = Claim.objects.filter(user=user).select_related('pitch__category').order_by('claimed_at')
     
     context = {
         'current_page': current_page,
@@ -60,30 +53,25 @@ def dashboard(request):
     
     return render(request, 'dashboard/dashboard.html', context)
 
+def engagement_total_expression():
+    """Likes + retweets + replies from a pitch's denormalized total_engagement."""
+    def metric(key):
+        return Coalesce(Cast(KT(f'total_engagement__{key}'), IntegerField()), Value(0))
+    return metric('likes') + metric('retweets') + metric('replies')
+
+
 def get_user_stats(user):
     """
-    Calculate user-specific statistics
+    Calculate user-specific statistics in a single aggregate query
     """
-    # Get all claims
-    claims = Claim.objects.filter(user=user)
-    
-    # Count verified claims
-    verified_claims = claims.filter(status=Claim.VERIFIED).count()
-    
-    # List Pitches that have been claimed via Claim model
-    user_pitches = Pitch.objects.filter(claims__user=user)
-    
-    # Calculate total engagement for user's pitches
-    total_engagement = 0
-    for pitch in user_pitches:
-        engagement = pitch.get_engagement_data()
-        total_engagement += engagement.get('likes', 0) + engagement.get('retweets', 0) + engagement.get('replies', 0)
-    
-    return {
-        'total_owned': user_pitches.count(),
-        'verified_claims': verified_claims,
-        'total_engagement': total_engagement,
-    }
+    # (user, pitch) is unique on Claim, so the join yields one row per owned pitch
+    stats = Pitch.objects.filter(claims__user=user).aggregate(
+        total_owned=Count('id'),
+        verified_claims=Count('id', filter=Q(claims__status=Claim.VERIFIED)),
+        pending_claims=Count('id', filter=Q(claims__status=Claim.PENDING)),
+        total_engagement=Coalesce(Sum(engagement_total_expression()), Value(0)),
+    )
+    return stats
 
 @login_required
 def onboard_user(request):
@@ -107,36 +95,13 @@ def onboard_user(request):
         profile.onboarding_complete = True
         profile.save()
         
-        # Find pitches that mention this handle
-        matching_pitches = []
-        all_pitches = Pitch.objects.all()
+        # Claim every pitch that mentions this handle
+        match_count, in_background = match_claims(request.user, x_handle)
         
-        for pitch in all_pitches:
-            if pitch.pitch_data:
-                # Ensure pitch_data is a list
-                pitch_data = pitch.pitch_data
-                if isinstance(pitch_data, str):
-                    try:
-                        pitch_data = json.loads(pitch_data)
-                    except json.JSONDecodeError:
-                        pitch_data = []
-                elif not isinstance(pitch_data, list):
-                    pitch_data = []
-                
-                # Check if any mention matches the handle
-                for mention in pitch_data:
-                    if isinstance(mention, dict):
-                        user_data = mention.get('user', {})
-                        if user_data.get('handle', '').lower() == x_handle.lower():
-                            # Create claim
-                            Claim.objects.get_or_create(
-                                user=request.user,
-                                pitch=pitch,
-                                defaults={'status': Claim.PENDING}
-                            )
-                            break
-        
-        messages.success(request, f"Found {len(matching_pitches)} pitches mentioning @{x_handle}")
+        if in_background:
+            messages.success(request, f"Found {match_count} pitches mentioning @{x_handle}. Your claims are being created and will appear shortly.")
+        else:
+            messages.success(request, f"Found {match_count} pitches mentioning @{x_handle}")
         return redirect('dashboard')
     
     return redirect('dashboard')
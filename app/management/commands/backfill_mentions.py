@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Mention, Pitch
+
+
+class Command(BaseCommand):
+    help = "Backfill the Mention table from every pitch's pitch_data JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help="Pitches per batch (each batch is one transaction)")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pitches = Pitch.objects.only('id', 'pitch_data').order_by('id').iterator(chunk_size=batch_size)
+
+        total_pitches = 0
+        total_mentions = 0
+        batch = []
+        for pitch in pitches:
+            batch.append(pitch)
+            if len(batch) >= batch_size:
+                total_mentions += Mention.rebuild_for(batch)
+                total_pitches += len(batch)
+                batch = []
+        if batch:
+            total_mentions += Mention.rebuild_for(batch)
+            total_pitches += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {total_mentions} mentions for {total_pitches} pitches"
+        ))
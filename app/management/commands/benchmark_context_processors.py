@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+from django.test import RequestFactory
+
+from app.context_processors import categories_context, featured_pitches_context
+from app.models import Category, Pitch
+from app.utils.query_budget import QueryRecorder
+
+# Touches both values the way the base templates do
+NAV_TEMPLATE = Template(
+    "{% for category in categories %}{{ category.name }}{% endfor %}"
+    "{% for pitch in featured_pitches|slice:':2' %}{{ pitch.name }}{% endfor %}"
+)
+# Never reads them, like the legal pages and JSON partials
+PLAIN_TEMPLATE = Template("{{ current_page }}")
+
+
+class Command(BaseCommand):
+    help = "Compare per-render query counts of the uncached and cached category/featured context processors"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=100, help="Renders per scenario")
+
+    def measure(self, label, renders, template, build_context):
+        with QueryRecorder() as recorder:
+            start = time.perf_counter()
+            for _ in range(renders):
+                template.render(Context(build_context()))
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{label:<32} {recorder.count / renders:>6.2f} queries/render "
+            f"{elapsed / renders * 1000:>8.3f} ms/render"
+        )
+
+    def handle(self, *args, **options):
+        renders = options['renders']
+        request = RequestFactory().get('/')
+
+        def uncached():
+            # The querysets the context processors returned before caching
+            return {
+                'categories': Category.objects.filter(pitches__isnull=False).distinct().order_by('name'),
+                'featured_pitches': Pitch.objects.filter(is_featured=True).select_related('category').order_by('-rank')[:2],
+            }
+
+        def cached():
+            return {**categories_context(request), **featured_pitches_context(request)}
+
+        # Warm the cache so the cached scenarios measure steady state
+        NAV_TEMPLATE.render(Context(cached()))
+
+        self.measure("before: nav template", renders, NAV_TEMPLATE, uncached)
+        self.measure("after: nav template", renders, NAV_TEMPLATE, cached)
+        self.measure("before: template without nav", renders, PLAIN_TEMPLATE, uncached)
+        self.measure("after: template without nav", renders, PLAIN_TEMPLATE, cached)
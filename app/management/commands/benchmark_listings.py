@@ -0,0 +1,88 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from app.models import Category, Pitch
+from app.utils.cursor_pagination import CREATED_ORDERING, RANK_ORDERING, cursor_paginate
+from app.utils.listings import top_pitches_by_category
+
+
+class Command(BaseCommand):
+    help = "Seed N pitches in a rolled-back transaction and report the plan and latency of each listing query"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pitches', type=int, default=10000, help="Pitches to seed")
+        parser.add_argument('--categories', type=int, default=20, help="Categories to seed")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per query")
+        parser.add_argument('--no-plans', action='store_true', help="Skip the EXPLAIN output")
+
+    def seed(self, pitch_count, category_count):
+        categories = Category.objects.bulk_create([
+            Category(name=f"Benchmark category {i}", slug=f"benchmark-category-{i}")
+            for i in range(category_count)
+        ])
+        Pitch.objects.bulk_create([
+            Pitch(
+                name=f"Benchmark pitch {i}",
+                title=f"Benchmark pitch {i}",
+                slug=f"benchmark-pitch-{i}",
+                url=f"https://benchmark-{i}.example.com",
+                social_links='{}',
+                tags='[]',
+                category=random.choice(categories),
+                rank=random.randint(0, 100000),
+                is_featured=random.random() < 0.01,
+            )
+            for i in range(pitch_count)
+        ], batch_size=1000)
+        if connection.vendor == 'postgresql':
+            # Fresh statistics so the planner sees the seeded distribution
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Pitch._meta.db_table}")
+        return categories
+
+    def listing_queries(self, categories, pitch_count):
+        """(label, queryset to EXPLAIN or None, callable running the listing) per listing view."""
+        category = categories[0]
+        deep_page = cursor_paginate(Pitch.objects.all(), RANK_ORDERING, per_page=pitch_count // 2)
+        urls = [f"https://benchmark-{i}.example.com" for i in random.sample(range(pitch_count), min(200, pitch_count))]
+
+        leaderboard = Pitch.objects.order_by(*RANK_ORDERING)[:21]
+        new = Pitch.objects.order_by(*CREATED_ORDERING)[:21]
+        featured = Pitch.objects.filter(is_featured=True).order_by('-rank')[:2]
+        in_category = Pitch.objects.filter(category=category).order_by(*RANK_ORDERING)[:21]
+        by_url = Pitch.objects.filter(url__in=urls)
+        return [
+            ("leaderboard first page", leaderboard, lambda: list(leaderboard)),
+            ("leaderboard deep cursor page", None,
+             lambda: cursor_paginate(Pitch.objects.all(), RANK_ORDERING, cursor=deep_page.next_cursor)),
+            ("new pitches feed", new, lambda: list(new)),
+            ("featured pitches", featured, lambda: list(featured)),
+            ("category_detail", in_category, lambda: list(in_category)),
+            ("categories page", None, top_pitches_by_category),
+            ("ingestion url lookup (200 urls)", by_url, lambda: list(by_url)),
+        ]
+
+    def handle(self, *args, **options):
+        pitch_count = options['pitches']
+        with transaction.atomic():
+            categories = self.seed(pitch_count, options['categories'])
+            self.stdout.write(f"Seeded {pitch_count} pitches in {len(categories)} categories ({connection.vendor})")
+
+            for label, queryset, run in self.listing_queries(categories, pitch_count):
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    run()
+                    timings.append(time.perf_counter() - start)
+                timings.sort()
+                self.stdout.write(self.style.SUCCESS(
+                    f"\n{label}: median {timings[len(timings) // 2] * 1000:.2f}ms, "
+                    f"worst {timings[-1] * 1000:.2f}ms"
+                ))
+                if queryset is not None and not options['no_plans']:
+                    self.stdout.write(queryset.explain())
+
+            transaction.set_rollback(True)
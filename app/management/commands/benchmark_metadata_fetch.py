@@ -0,0 +1,107 @@
+import functools
+import threading
+import time
+import tracemalloc
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from app.utils.metadata_extraction import (
+    get_site_metadata, get_sites_metadata, parse_head_metadata, parse_site_metadata,
+)
+
+
+class SlowHandler(SimpleHTTPRequestHandler):
+    """Serves the corpus directory, sleeping latency seconds per request to mimic remote sites."""
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = ("Compare the BeautifulSoup and head-only parsers on a directory of saved pages, then "
+            "serve it from a local stub server and compare the serial get_site_metadata loop "
+            "with the concurrent batch fetcher")
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', help="Directory of saved .html pages")
+        parser.add_argument('--latency', type=int, default=200, help="Simulated per-request latency in ms")
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--per-host', type=int, default=20,
+                            help="Per-host limit (every stub page shares one host)")
+        parser.add_argument('--parse-only', action='store_true', help="Skip the fetch comparison")
+
+    def handle(self, *args, **options):
+        corpus = Path(options['corpus'])
+        pages = sorted(path.name for path in corpus.glob('*.html'))
+        if not pages:
+            raise CommandError(f"No .html pages in {corpus}")
+
+        self.compare_parsers(corpus, pages)
+        if options['parse_only']:
+            return
+
+        handler = type('Handler', (SlowHandler,), {'latency': options['latency'] / 1000})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(handler, directory=str(corpus)))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_address[1]}/"
+        urls = [base + page for page in pages]
+
+        try:
+            # Time real fetches, and keep the stub pages out of the shared HTTP cache
+            with override_settings(HTTP_CACHE_ENABLED=False):
+                start = time.perf_counter()
+                serial = {url: get_site_metadata(url, head_only=False) for url in urls}
+                serial_seconds = time.perf_counter() - start
+
+                start = time.perf_counter()
+                batch = get_sites_metadata(urls, concurrency=options['concurrency'],
+                                           per_host=options['per_host'], head_only=False)
+                batch_seconds = time.perf_counter() - start
+        finally:
+            server.shutdown()
+
+        mismatches = [url for url in urls if serial[url] != batch[url]]
+        self.stdout.write(f"Pages:  {len(urls)}")
+        self.stdout.write(f"Serial: {serial_seconds:.3f}s")
+        self.stdout.write(f"Batch:  {batch_seconds:.3f}s")
+        if mismatches:
+            for url in mismatches:
+                self.stdout.write(self.style.ERROR(f"Different metadata for {url}"))
+            raise CommandError(f"{len(mismatches)} pages differ between the two fetchers")
+        self.stdout.write(self.style.SUCCESS("Both fetchers return identical metadata"))
+
+    def compare_parsers(self, corpus, pages):
+        url = "https://example.com/"
+        raw_documents = [(corpus / page).read_bytes() for page in pages]
+        documents = [raw.decode('utf-8', errors='replace') for raw in raw_documents]
+
+        def measure(parse, inputs):
+            tracemalloc.start()
+            start = time.perf_counter()
+            results = [parse(document) for document in inputs]
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return results, seconds, peak
+
+        full, full_seconds, full_peak = measure(lambda document: parse_site_metadata(document, url), documents)
+        # Fed in 8 KiB pieces of raw bytes, as the streaming fetch does
+        head, head_seconds, head_peak = measure(lambda document: parse_head_metadata(
+            (document[i:i + 8192] for i in range(0, len(document), 8192)), url), raw_documents)
+
+        self.stdout.write(f"BeautifulSoup parse: {full_seconds:.3f}s, peak {full_peak / 1024:.0f} KiB")
+        self.stdout.write(f"Head-only parse:     {head_seconds:.3f}s, peak {head_peak / 1024:.0f} KiB")
+        mismatches = [page for page, a, b in zip(pages, full, head) if a != b]
+        if mismatches:
+            for page in mismatches:
+                self.stdout.write(self.style.ERROR(f"Different metadata for {page}"))
+            raise CommandError(f"{len(mismatches)} pages differ between the two parsers")
+        self.stdout.write(self.style.SUCCESS("Both parsers return identical metadata"))
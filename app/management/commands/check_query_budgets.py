@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from app.models import Category, Pitch
+from app.utils.query_budget import QueryRecorder, check_budget
+
+
+class Command(BaseCommand):
+    help = "Request the main pages and check their query counts against QUERY_BUDGETS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help="Log in as this user (needed for the dashboard)")
+        parser.add_argument('--verbose-sql', action='store_true',
+                            help="Print the repeated statements of every page")
+
+    def pages(self):
+        """(view_name, url) for every budgeted page that has data to show."""
+        pages = [
+            ('index', reverse('index')),
+            ('pitches', reverse('pitches')),
+            ('leaderboard', reverse('leaderboard')),
+            ('categories', reverse('categories')),
+            ('sitemap', reverse('sitemap')),
+        ]
+        pitch = Pitch.objects.order_by('-rank').only('slug').first()
+        if pitch and pitch.slug:
+            pages.append(('detail', reverse('detail', args=[pitch.slug])))
+        category = Category.objects.filter(pitches__isnull=False).only('slug').first()
+        if category and category.slug:
+            pages.append(('category_detail', reverse('category_detail', args=[category.slug])))
+        return pages
+
+    def host(self):
+        """A host name the site accepts, for the Host header of the requests."""
+        for host in settings.ALLOWED_HOSTS:
+            if host != '*':
+                return host.lstrip('.')
+        return 'localhost'
+
+    def handle(self, *args, **options):
+        # Queries are recorded through connection.execute_wrapper, so the test
+        # environment is not needed; only the host has to pass ALLOWED_HOSTS
+        client = Client(HTTP_HOST=self.host())
+        pages = self.pages()
+
+        if options['username']:
+            user = get_user_model().objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['username']}")
+            client.force_login(user)
+            pages.append(('dashboard', reverse('dashboard')))
+
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        default_budget = getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+        max_duplicates = getattr(settings, 'QUERY_BUDGET_MAX_DUPLICATES', None)
+
+        failures = 0
+        for view_name, url in pages:
+            # Pages may record analytics; leave the database as it was
+            with transaction.atomic():
+                with QueryRecorder() as recorder:
+                    response = client.get(url)
+                transaction.set_rollback(True)
+
+            budget = budgets.get(view_name, default_budget)
+            problems = check_budget(recorder, budget, max_duplicates, view_name)
+            line = f"{view_name:<16} {response.status_code} {recorder.count:>4} queries (budget {budget})"
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(line))
+                for problem in problems:
+                    self.stdout.write(f"    {problem}")
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
+            if options['verbose_sql'] or problems:
+                self.stdout.write(recorder.report(view_name))
+
+        if failures:
+            raise CommandError(f"{failures} page(s) over their query budget")
+        self.stdout.write(self.style.SUCCESS("All pages within their query budgets"))
@@ -0,0 +1,61 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from app.utils.pitch_ingestion import ingest_pitches
+
+
+class Command(BaseCommand):
+    help = "Stream pitches from a JSONL file (one pitch object per line) into the database in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to a .jsonl file")
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help="Pitches per batch (each batch is one transaction)")
+        parser.add_argument('--user', default=None,
+                            help="Username to own newly created pitches")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']!r} does not exist")
+
+        invalid = 0
+
+        def read_items(handle):
+            nonlocal invalid
+            for line_number, line in enumerate(handle, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as e:
+                    self.stderr.write(f"Line {line_number}: invalid JSON ({e})")
+                    invalid += 1
+                    continue
+                # A line may hold a single pitch or a list of them
+                for pitch in item if isinstance(item, list) else [item]:
+                    if isinstance(pitch, dict):
+                        yield pitch
+                    else:
+                        invalid += 1
+
+        def progress(result):
+            self.stdout.write(f"Created {len(result['created'])}, updated {len(result['updated'])} so far")
+
+        try:
+            with open(options['path'], encoding='utf-8') as handle:
+                result = ingest_pitches(read_items(handle), user=user,
+                                        batch_size=options['batch_size'], progress=progress)
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Import finished: {len(result['created'])} created, {len(result['updated'])} updated, "
+            f"{result['skipped']} skipped (no URL), {invalid} invalid"
+        ))
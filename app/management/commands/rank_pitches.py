@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Pitch
+from app.utils.ranking_system import recompute_ranks
+from app.utils.vectorized_ranking import benchmark_rank_paths, bulk_rank_pitches
+
+
+class Command(BaseCommand):
+    help = "Recompute every pitch rank with the vectorized NumPy ranking path"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows per bulk_update batch")
+        parser.add_argument('--benchmark', action='store_true',
+                            help="Compare against the per-row save() path without writing anything")
+        parser.add_argument('--refresh-engagement', action='store_true',
+                            help="Rebuild total_engagement from pitch_data before ranking")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if options['refresh_engagement']:
+            refreshed = recompute_ranks(Pitch.objects.all(), batch_size=batch_size)
+            self.stdout.write(f"Refreshed engagement totals for {refreshed} pitches")
+
+        if options['benchmark']:
+            result = benchmark_rank_paths(batch_size=batch_size)
+            self.stdout.write(f"Rows: {result['rows']}")
+            self.stdout.write(f"Per-row save(): {result['per_row_seconds']:.3f}s")
+            self.stdout.write(f"Vectorized:     {result['vectorized_seconds']:.3f}s")
+            if result['mismatches']:
+                self.stdout.write(self.style.WARNING(
+                    f"{result['mismatches']} ranks differ between the two paths "
+                    "(stale total_engagement; rerun with --refresh-engagement)"
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS("Both paths produce identical ranks"))
+            return
+
+        updated = bulk_rank_pitches(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Updated rank for {updated} pitches"))
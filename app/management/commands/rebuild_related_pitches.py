@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import Pitch
+from app.utils.related_graph import TOP_K, rebuild_related_pitches, refresh_related_pitches
+
+
+class Command(BaseCommand):
+    help = "Rebuild the related-pitches graph (all pitches, or only the given / recently updated ones)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pitch', type=int, nargs='+', dest='pitch_ids',
+                            help="Only refresh these pitch ids")
+        parser.add_argument('--updated-since', type=int, metavar='MINUTES',
+                            help="Only refresh pitches updated in the last MINUTES minutes")
+        parser.add_argument('--top-k', type=int, default=TOP_K, help="Neighbours stored per pitch")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Pitches per transaction during a full rebuild")
+
+    def handle(self, *args, **options):
+        k = options['top_k']
+        pitch_ids = options['pitch_ids']
+        if options['updated_since'] is not None:
+            since = timezone.now() - timedelta(minutes=options['updated_since'])
+            pitch_ids = list(Pitch.objects.filter(updated_at__gte=since).values_list('id', flat=True))
+
+        if pitch_ids is not None:
+            refreshed = refresh_related_pitches(pitch_ids, k=k)
+            self.stdout.write(self.style.SUCCESS(f"Refreshed related pitches for {refreshed} pitches"))
+            return
+
+        rebuilt = rebuild_related_pitches(k=k, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt related pitches for {rebuilt} pitches"))
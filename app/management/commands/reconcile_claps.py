@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from app.models import Clap, Pitch, effective_claps_expression
+from app.utils.listings import invalidate_listings
+from app.utils.ranking_system import calculate_rank
+
+
+class Command(BaseCommand):
+    help = ("Rebuild Pitch.clap and Pitch.raw_clap_total from the Clap table. Run it right after "
+            "the migration adding raw_clap_total, which starts every pitch at 0")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Rows per bulk_update batch")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # One grouped query for both totals of every clapped pitch
+        totals = {
+            row['pitch_id']: (row['effective'] or 0, row['raw'] or 0)
+            for row in (Clap.objects
+                        .order_by()
+                        .values('pitch_id')
+                        .annotate(raw=Sum('count'), effective=Sum(effective_claps_expression())))
+        }
+
+        pitches = (Pitch.objects
+                   .only('id', 'clap', 'raw_clap_total', 'rank', 'claimed', 'total_engagement')
+                   .iterator(chunk_size=batch_size))
+
+        fixed = 0
+        pending = []
+        with transaction.atomic():
+            for pitch in pitches:
+                effective, raw = totals.get(pitch.id, (0, 0))
+                if pitch.clap == effective and pitch.raw_clap_total == raw:
+                    continue
+                pitch.clap = effective
+                pitch.raw_clap_total = raw
+                pitch.rank = calculate_rank(pitch.total_engagement or {}, claps=effective, claimed=pitch.claimed)
+                pending.append(pitch)
+                if len(pending) >= batch_size:
+                    Pitch.objects.bulk_update(pending, ['clap', 'raw_clap_total', 'rank'])
+                    fixed += len(pending)
+                    pending = []
+            if pending:
+                Pitch.objects.bulk_update(pending, ['clap', 'raw_clap_total', 'rank'])
+                fixed += len(pending)
+            if fixed:
+                invalidate_listings()
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled clap totals for {fixed} pitches"))
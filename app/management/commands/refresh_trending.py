@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import Pitch
+from app.utils.ranking_system import refresh_trending_scores
+
+
+class Command(BaseCommand):
+    help = "Recompute the time-decayed trending score of every pitch (run periodically, e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--half-life', type=float, default=None,
+                            help="Half-life in hours (defaults to settings.TRENDING_HALF_LIFE_HOURS)")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Rows per bulk_update batch")
+
+    def handle(self, *args, **options):
+        half_life = options['half_life'] or getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 48)
+        updated = refresh_trending_scores(
+            Pitch.objects.all(),
+            now=timezone.now(),
+            half_life_hours=half_life,
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated trending score for {updated} pitches (half-life {half_life}h)"
+        ))
@@ -0,0 +1,48 @@
+# middleware.py
+import logging
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .utils.query_budget import QueryBudgetExceeded, QueryRecorder, check_budget
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetMiddleware:
+    """
+    Opt-in per-request query recorder (QUERY_BUDGET_ENABLED).
+
+    Every request's queries are counted and grouped by normalized SQL. When a
+    view goes over its budget (QUERY_BUDGETS[view_name], else
+    QUERY_BUDGET_DEFAULT) or repeats a statement more than
+    QUERY_BUDGET_MAX_DUPLICATES times, the offending statements are logged,
+    or QueryBudgetExceeded is raised if QUERY_BUDGET_RAISE is set. The count
+    is also returned in an X-Query-Count header.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.default_budget = getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+        self.view_budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        self.max_duplicates = getattr(settings, 'QUERY_BUDGET_MAX_DUPLICATES', None)
+        self.raise_on_exceeded = getattr(settings, 'QUERY_BUDGET_RAISE', False)
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else request.path
+        budget = self.view_budgets.get(view_name, self.default_budget)
+        response['X-Query-Count'] = str(recorder.count)
+
+        problems = check_budget(recorder, budget, self.max_duplicates, view_name)
+        if problems:
+            message = f"{view_name} over query budget: " + "; ".join(problems)
+            if self.raise_on_exceeded:
+                raise QueryBudgetExceeded(message + "\n" + recorder.report(view_name))
+            logger.warning("%s\n%s", message, recorder.report(view_name))
+        return response
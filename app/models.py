@@ -1,11 +1,14 @@
 # models.py
-import json
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 from django.utils import timezone
 from bs4 import BeautifulSoup
-from .utils.ranking_system import calculate_rank
+from .utils.ranking_system import (
+    calculate_rank, coerce_pitch_data, mention_engagement, parse_mention_datetime, pitch_data_changed,
+    rank_expression, snapshot_rank_inputs, sum_engagement, update_rank,
+)
 import random
 
 from django.core.exceptions import ValidationError
@@ -79,8 +82,12 @@ class Pitch(models.Model):
     mention_count = models.IntegerField(default=0, help_text="Number of social media mentions")
     # Clap field now managed by the Clap model
     clap = models.IntegerField(default=0, help_text="Total effective claps from all users")
+    # Backfilled by `manage.py reconcile_claps` right after the migration that adds it
+    raw_clap_total = models.PositiveIntegerField(default=0, help_text="Total raw claps from all users (shown in the UI)")
     claimed = models.BooleanField(default=False)
     rank = models.IntegerField(default=1)
+    # Time-decayed score, refreshed periodically by `manage.py refresh_trending`
+    trending_score = models.FloatField(default=0, help_text="Time-decayed engagement score for the trending leaderboard")
     
 
     def add_clap(self, user, clap_count=1):
@@ -88,43 +95,65 @@ class Pitch(models.Model):
         Add multiple claps from a user (e.g. from debounced frontend),
         but enforce max 10 total claps per user per pitch.
 
+        The user's Clap row is advanced with a conditional (compare-and-swap)
+        UPDATE, so concurrent clappers never lose increments and no row locks
+        are taken. The resulting change in effective claps is applied to
+        Pitch.clap and rank in a single UPDATE, without re-reading every Clap.
+
         Args:
             user: Authenticated user
             clap_count (int): Number of claps user attempted (e.g. 30)
 
         Returns:
-            int: New total effective clap count for the pitch
+            dict: 'display_claps' (raw claps), 'effective_claps', 'rank'
+                  and 'user_claps' (this user's clap count)
         """
         if not user.is_authenticated:
-            return self.clap  # No change
-
-        # Get or create the user's clap record for this pitch
-        clap, created = Clap.objects.get_or_create(
-            user=user,
-            pitch=self,
-            defaults={'count': 0}  # Start at 0, then add below
-        )
-
-        # Determine new total claps after adding
-        new_total = clap.count + clap_count
-
-        # Enforce max of 10
-        final_count = min(new_total, 10)
-
-        # Only update if there's a change
-        if final_count > clap.count:
-            clap.count = final_count
-            clap.save(update_fields=['count', 'last_clapped'])
-
-        # Recalculate effective clap total for the pitch
-        self.clap = self.get_effective_clap_count()
-        self.save()
-
-        return self.clap
+            return {
+                'display_claps': self.raw_clap_total,
+                'effective_claps': self.clap,
+                'rank': self.rank,
+                'user_claps': 0,
+            }
+
+        with transaction.atomic():
+            old_count, new_count = Clap.advance(user.pk, self.pk, clap_count)
+
+            # Apply the raw and effective clap deltas to the pitch in one statement
+            if new_count > old_count:
+                Pitch.apply_clap_delta(
+                    self.pk,
+                    effective_claps(new_count) - effective_claps(old_count),
+                    raw_delta=new_count - old_count,
+                )
+                self.clap, self.raw_clap_total, self.rank = (
+                    Pitch.objects.values_list('clap', 'raw_clap_total', 'rank').get(pk=self.pk)
+                )
+                if getattr(self, '_rank_snapshot', None) is not None:
+                    self._rank_snapshot['clap'] = self.clap
+
+        return {
+            'display_claps': self.raw_clap_total,
+            'effective_claps': self.clap,
+            'rank': self.rank,
+            'user_claps': new_count,
+        }
+    
+    @classmethod
+    def apply_clap_delta(cls, pitch_id, delta, raw_delta=0):
+        """
+        Add delta effective claps (and raw_delta raw claps) to a pitch and
+        recompute its rank in a single UPDATE
+        """
+        updates = {'raw_clap_total': F('raw_clap_total') + raw_delta}
+        if delta:
+            updates['clap'] = F('clap') + delta
+            updates['rank'] = rank_expression(F('clap') + delta)
+        return cls.objects.filter(pk=pitch_id).update(**updates)
     
     def get_clap_count(self):
-        """Get the total number of claps for this pitch"""
-        return self.user_claps.aggregate(total_claps=models.Sum('count'))['total_claps'] or 0
+        """Get the total number of claps for this pitch (denormalized, no query)"""
+        return self.raw_clap_total
     
     def get_effective_clap_count(self):
         """Get the total effective number of claps for this pitch"""
@@ -147,36 +176,52 @@ class Pitch(models.Model):
     
     class Meta:
         ordering = ['-rank', '-created_at']
+        # Each index matches a listing query's filter + ORDER BY (see benchmark_listings)
         indexes = [
-            models.Index(fields=['rank']),
-            models.Index(fields=['category']),
-            models.Index(fields=['is_featured']),
-            models.Index(fields=['created_at']),
+            # Leaderboard / home: ORDER BY rank DESC, id DESC (keyset pages)
+            models.Index(fields=['-rank', '-id'], name='pitch_rank_id_idx'),
+            # Feeds: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['-created_at', '-id'], name='pitch_created_id_idx'),
+            # category_detail / categories page: WHERE category_id = X ORDER BY rank DESC
+            models.Index(fields=['category', '-rank', '-id'], name='pitch_category_rank_idx'),
+            # Featured pitches: partial index over the few featured rows only
+            models.Index(fields=['-rank'], condition=Q(is_featured=True), name='pitch_featured_rank_idx'),
+            # Ingestion: WHERE url IN (...)
+            models.Index(fields=['url'], name='pitch_url_idx'),
+            models.Index(fields=['trending_score', 'id']),
         ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded rank inputs so save() only recomputes what changed
+        instance._rank_snapshot = snapshot_rank_inputs(instance)
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        snapshot = snapshot_rank_inputs(self)
+        previous = getattr(self, '_rank_snapshot', None)
+        if fields is not None and previous is not None:
+            # Only the refreshed fields now match the database
+            snapshot = {field: snapshot[field] if field in fields else previous[field] for field in snapshot}
+        self._rank_snapshot = snapshot
+
     def get_engagement_data(self):
-            """Calculate total engagement from all pitch_data entries"""
-            if not self.pitch_data:
-                return {"replies": 0, "retweets": 0, "likes": 0, "views": 0}
-            
-            # Ensure pitch_data is a list
-            pitch_data = self.pitch_data
-            if isinstance(pitch_data, str):
-                try:
-                    pitch_data = json.loads(pitch_data)
-                except json.JSONDecodeError:
-                    pitch_data = []
-            elif not isinstance(pitch_data, list):
-                pitch_data = []
-            
-            total = {"replies": 0, "retweets": 0, "likes": 0, "views": 0}
-            for pitch in pitch_data:
-                if isinstance(pitch, dict):
-                    engagement = pitch.get("engagement", {})
-                    for key in total:
-                        total[key] += engagement.get(key, 0)
-            
-            return total
+            """Calculate total engagement from all mentions (one indexed aggregate)"""
+            if self.pk is None:
+                return sum_engagement(self.pitch_data)
+            totals = self.mentions.aggregate(
+                replies=models.Sum('replies'),
+                retweets=models.Sum('retweets'),
+                likes=models.Sum('likes'),
+                views=models.Sum('views'),
+                rows=models.Count('id'),
+            )
+            if not totals.pop('rows'):
+                # Mentions not backfilled yet for this pitch
+                return sum_engagement(self.pitch_data)
+            return {key: value or 0 for key, value in totals.items()}
     
     def rank_setter(self):
         """
@@ -184,22 +229,13 @@ class Pitch(models.Model):
         the number of claps, and claimed status.
         """
         # Calculate total engagement from all social media mentions
-        total_engagement = self.get_engagement_data()
+        total_engagement = sum_engagement(self.pitch_data)
         
         # Update the stored total_engagement field
         self.total_engagement = total_engagement
         
         # Get mention count safely
-        pitch_data = self.pitch_data
-        if isinstance(pitch_data, str):
-            try:
-                pitch_data = json.loads(pitch_data)
-            except json.JSONDecodeError:
-                pitch_data = []
-        elif not isinstance(pitch_data, list):
-            pitch_data = []
-            
-        self.mention_count = len(pitch_data)
+        self.mention_count = len(coerce_pitch_data(self.pitch_data))
         
         # Calculate rank using total engagement
         score = calculate_rank(
@@ -220,8 +256,12 @@ class Pitch(models.Model):
                 total.get('replies', 0) * 3)
 
     def save(self, *args, **kwargs):
-        # Update rank and engagement totals
-        self.rank_setter()
+        # Update rank and engagement totals, only if their inputs changed
+        snapshot = getattr(self, '_rank_snapshot', None)
+        mentions_changed = pitch_data_changed(self, snapshot)
+        changed_rank_fields = update_rank(self, snapshot)
+        if changed_rank_fields and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | changed_rank_fields
         
         # Generate slug if not exists
         if not self.slug and self.name:
@@ -237,6 +277,9 @@ class Pitch(models.Model):
             self.name = "Untitled Pitch"
         
         super().save(*args, **kwargs)
+        self._rank_snapshot = snapshot_rank_inputs(self)
+        if mentions_changed:
+            Mention.rebuild_for([self])
 
     def __str__(self):
         return f"{self.name} ({self.category.name if self.category else 'Uncategorized'})"
@@ -246,28 +289,155 @@ class Pitch(models.Model):
         if not self.pitch_data:
             return None
         
-        # Ensure pitch_data is a list
-        pitch_data = self.pitch_data
-        if isinstance(pitch_data, str):
-            try:
-                pitch_data = json.loads(pitch_data)
-            except json.JSONDecodeError:
-                pitch_data = []
-        elif not isinstance(pitch_data, list):
-            pitch_data = []
-        
-        if not pitch_data:
-            return None
+        if self.pk is not None:
+            latest = (self.mentions
+                      .order_by(models.F('posted_at').desc(nulls_last=True))
+                      .values_list('data', flat=True)
+                      .first())
+            if latest is not None:
+                return latest
         
-        # Sort by timestamp and return the latest
+        # Mentions not backfilled yet: sort pitch_data by timestamp
         sorted_pitches = sorted(
-            [p for p in pitch_data if isinstance(p, dict)], 
+            [p for p in coerce_pitch_data(self.pitch_data) if isinstance(p, dict)], 
             key=lambda x: x.get('timestamp', {}).get('datetime', ''), 
             reverse=True
         )
         return sorted_pitches[0] if sorted_pitches else None
    
     
+class Mention(models.Model):
+    """
+    One social media mention of a pitch, normalized from an entry of Pitch.pitch_data.
+
+    The unique (pitch, reply_link) index makes replyLink lookups O(1) during
+    ingestion. It only covers non-empty links: mentions without a replyLink
+    each keep their own row. Indexed columns serve latest-mention lookups,
+    handle matching and engagement totals.
+    """
+    pitch = models.ForeignKey(Pitch, on_delete=models.CASCADE, related_name='mentions')
+    reply_link = models.CharField(max_length=500, blank=True, default='')
+    position = models.PositiveIntegerField(default=0, help_text="Index of this mention in Pitch.pitch_data")
+
+    # Author
+    handle = models.CharField(max_length=100, blank=True, default='')
+    handle_lower = models.CharField(max_length=100, blank=True, default='', help_text="Lowercased handle for indexed lookups")
+    name = models.CharField(max_length=255, blank=True, default='')
+    verified = models.BooleanField(default=False)
+
+    # Tweet
+    posted_at = models.DateTimeField(null=True, blank=True, help_text="From timestamp.datetime")
+    links = models.JSONField(default=list, blank=True)
+
+    # Engagement
+    replies = models.PositiveIntegerField(default=0)
+    retweets = models.PositiveIntegerField(default=0)
+    likes = models.PositiveIntegerField(default=0)
+    views = models.PositiveBigIntegerField(default=0)
+
+    data = models.JSONField(default=dict, blank=True, help_text="The mention as stored in pitch_data")
+
+    class Meta:
+        ordering = ['pitch', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['pitch', 'reply_link'], condition=~Q(reply_link=''),
+                                    name='unique_mention_per_pitch'),
+        ]
+        indexes = [
+            models.Index(fields=['pitch', 'posted_at']),
+            models.Index(fields=['handle_lower', 'pitch']),
+        ]
+
+    @classmethod
+    def from_pitch_data(cls, pitch_id, position, mention):
+        """Build an (unsaved) Mention from a pitch_data entry"""
+        user = mention.get('user') or {}
+        engagement = mention_engagement(mention)
+
+        def counter(key):
+            try:
+                return max(0, int(engagement[key] or 0))
+            except (TypeError, ValueError):
+                return 0
+
+        return cls(
+            pitch_id=pitch_id,
+            reply_link=mention.get('replyLink', '') or '',
+            position=position,
+            handle=(user.get('handle') or '')[:100],
+            handle_lower=(user.get('handle') or '')[:100].lower(),
+            name=(user.get('name') or '')[:255],
+            verified=bool(user.get('verified')),
+            posted_at=parse_mention_datetime(mention),
+            links=mention.get('links') or [],
+            replies=counter('replies'),
+            retweets=counter('retweets'),
+            likes=counter('likes'),
+            views=counter('views'),
+            data=mention,
+        )
+
+    @classmethod
+    def rows_for(cls, pitch, positions=None):
+        """
+        Mentions for the given positions of pitch.pitch_data (all by default),
+        one per non-empty reply_link; mentions without one are all kept
+        """
+        mentions = coerce_pitch_data(pitch.pitch_data)
+        if positions is None:
+            positions = range(len(mentions))
+        rows = {}
+        unlinked = []
+        for position in sorted(set(positions)):
+            mention = mentions[position]
+            if isinstance(mention, dict):
+                row = cls.from_pitch_data(pitch.pk, position, mention)
+                if row.reply_link:
+                    # A later duplicate replyLink wins, like the ingestion merge
+                    rows[row.reply_link] = row
+                else:
+                    unlinked.append(row)
+        return list(rows.values()) + unlinked
+
+    @classmethod
+    def rebuild_for(cls, pitches):
+        """Replace the Mention rows of pitches with a fresh copy of their pitch_data"""
+        pitches = [pitch for pitch in pitches if pitch.pk is not None]
+        with transaction.atomic():
+            cls.objects.filter(pitch__in=[pitch.pk for pitch in pitches]).delete()
+            rows = [row for pitch in pitches for row in cls.rows_for(pitch)]
+            cls.objects.bulk_create(rows, batch_size=500)
+        return len(rows)
+
+    def __str__(self):
+        return f"Mention of {self.pitch_id} by @{self.handle}: {self.reply_link}"
+
+
+class RelatedPitch(models.Model):
+    """
+    Precomputed edge of the related-pitches graph: related is the position-th
+    best neighbour of pitch, scored from shared category, tags and mention
+    handles. Rebuilt by the rebuild_related_pitches command.
+    """
+    pitch = models.ForeignKey(Pitch, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(Pitch, on_delete=models.CASCADE, related_name='+')
+    position = models.PositiveSmallIntegerField(default=0)
+    score = models.FloatField(default=0.0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['pitch', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['pitch', 'related'], name='unique_related_pitch'),
+        ]
+        indexes = [
+            models.Index(fields=['pitch', 'position']),
+        ]
+
+    def __str__(self):
+        return f"{self.pitch_id} -> {self.related_id} ({self.score:.1f})"
+
+
 class PitchAnalytics(models.Model):
     """Store analytics and tracking data for pitches"""
     pitch = models.OneToOneField(Pitch, on_delete=models.CASCADE, related_name='analytics')
@@ -310,7 +480,38 @@ class UserProfile(models.Model):
         return f"{self.user.username} - @{self.x_handle}"
 
 # Clap Model
+def effective_claps_expression(count='count'):
+    """SQL form of effective_claps over a Clap count column, for aggregates"""
+    return Case(
+        When(**{f'{count}__gte': 10}, then=Value(3)),
+        When(**{f'{count}__gte': 6}, then=Value(2)),
+        When(**{f'{count}__gte': 1}, then=Value(1)),
+        default=Value(0),
+        output_field=models.IntegerField(),
+    )
+
+
+def effective_claps(count):
+    """
+    Returns effective claps for a user's raw clap count:
+    - 1-5 claps → 1
+    - 6-9 claps → 2
+    - 10 claps → 3
+    - Max = 3
+    """
+    if count >= 10:
+        return 3
+    elif count >= 6:
+        return 2
+    elif count >= 1:
+        return 1
+    return 0
+
+
 class Clap(models.Model):
+    MAX_CLAPS = 10  # Per user per pitch
+
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='claps')
     pitch = models.ForeignKey('Pitch', on_delete=models.CASCADE, related_name='user_claps')
     count = models.PositiveIntegerField(default=1)  # Starts at 1
@@ -321,29 +522,54 @@ class Clap(models.Model):
         unique_together = ('user', 'pitch')
         ordering = ['-last_clapped']
 
+    @classmethod
+    def advance(cls, user_id, pitch_id, clap_count):
+        """
+        Add up to clap_count claps to a user's record for a pitch, capped at
+        MAX_CLAPS, and return (old_count, new_count).
+
+        The row is advanced with a conditional UPDATE that only matches the
+        count we last read, retrying on conflict, so concurrent callers never
+        lose increments and no row lock is held. Call inside a transaction.
+        """
+        # Get or create the user's clap record for this pitch
+        clap, created = cls.objects.get_or_create(
+            user_id=user_id,
+            pitch_id=pitch_id,
+            defaults={'count': 0}  # Start at 0, then add below
+        )
+
+        # Advance the count only if nobody else changed it since we read it
+        old_count = clap.count
+        while True:
+            new_count = min(old_count + clap_count, cls.MAX_CLAPS)
+            if new_count <= old_count:
+                return old_count, old_count
+            updated = cls.objects.filter(pk=clap.pk, count=old_count).update(
+                count=F('count') + (new_count - old_count),
+                last_clapped=timezone.now(),
+            )
+            if updated:
+                return old_count, new_count
+            old_count = cls.objects.values_list('count', flat=True).get(pk=clap.pk)
+
     def add_clap(self):
         """Increment clap count, up to a maximum of 10"""
-        if self.count >= 10:
-            return False  # Max reached
-        self.count += 1
-        self.save(update_fields=['count', 'last_clapped'])
+        with transaction.atomic():
+            old_count, new_count = Clap.advance(self.user_id, self.pitch_id, 1)
+            if new_count == old_count:
+                return False  # Max reached
+            Pitch.apply_clap_delta(
+                self.pitch_id,
+                effective_claps(new_count) - effective_claps(old_count),
+                raw_delta=new_count - old_count,
+            )
+        self.count = new_count
         return True
 
     def get_effective_claps(self):
-        """
-        Returns effective claps contributed by this user:
-        - 1-5 claps → 1
-        - 6-9 claps → 2
-        - 10 claps → 3
-        - Max = 3
-        """
-        if self.count >= 10:
-            return 3
-        elif self.count >= 6:
-            return 2
-        elif self.count >= 1:
-            return 1
-        return 0
+        """Returns effective claps contributed by this user (see effective_claps)"""
+        return effective_claps(self.count)
 
     def __str__(self):
         return f"{self.user.username} clapped {self.count} times on {self.pitch.name}"
@@ -377,9 +603,13 @@ class Claim(models.Model):
     claimed_at = models.DateTimeField(auto_now_add=True)
     verified_at = models.DateTimeField(auto_now=True) 
 
+    @staticmethod
+    def generate_verification_code():
+        return str(random.randint(10000000, 99999999))
+
     def save(self, *args, **kwargs):
         if not self.verification_code:
-            self.verification_code = str(random.randint(10000000, 99999999))
+            self.verification_code = self.generate_verification_code()
         super().save(*args, **kwargs)
 
     def verify(self, code):
@@ -0,0 +1,13 @@
+# signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category, Pitch
+from .utils.listings import invalidate_listings
+
+
+@receiver([post_save, post_delete], sender=Pitch)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_cached_listings(sender, **kwargs):
+    """A pitch's rank, category or featured flag, or a category itself, changed."""
+    invalidate_listings()
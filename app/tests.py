@@ -1,3 +1,138 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from .models import Category, Claim, Clap, Pitch
+from .utils.clap_buffer import ClapBuffer
+from .utils.query_budget import query_budget
+
+
+def make_pitch(name, **fields):
+    defaults = {
+        'title': name,
+        'social_links': '',
+        'tags': '[]',
+        'url': f"https://{name.lower()}.example.com",
+        'pitch_data': [{
+            'replyLink': f"https://x.com/founder/status/{name.lower()}",
+            'user': {'handle': 'founder', 'name': 'Founder'},
+            'engagement': {'replies': 4, 'retweets': 10, 'likes': 120, 'views': 5000},
+        }],
+    }
+    defaults.update(fields)
+    return Pitch.objects.create(name=name, **defaults)
+
+
+class ClapBufferTests(TestCase):
+    # (user index, claps attempted); goes past MAX_CLAPS for two users
+    CLAP_SEQUENCE = [(0, 3), (1, 5), (0, 9), (2, 1), (1, 20), (0, 1), (2, 4)]
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f"clapper{i}", password='x') for i in range(3)]
+
+    def test_buffered_totals_match_unbuffered(self):
+        buffered = make_pitch('Buffered')
+        direct = make_pitch('Direct')
+        # Long interval and event limit: nothing is written until flush()
+        buffer = ClapBuffer(flush_interval_ms=60000, max_events=1000)
+
+        for user_index, clap_count in self.CLAP_SEQUENCE:
+            user = self.users[user_index]
+            buffer.add(user, Pitch.objects.get(pk=buffered.pk), clap_count)
+            Pitch.objects.get(pk=direct.pk).add_clap(user, clap_count)
+        self.assertEqual(buffer.flush(), len(self.users))
+
+        for user in self.users:
+            self.assertEqual(
+                Clap.objects.get(user=user, pitch=buffered).count,
+                Clap.objects.get(user=user, pitch=direct).count,
+            )
+        buffered.refresh_from_db()
+        direct.refresh_from_db()
+        self.assertEqual(buffered.clap, direct.clap)
+        self.assertEqual(buffered.raw_clap_total, direct.raw_clap_total)
+        self.assertEqual(buffered.rank, direct.rank)
+
+    def test_capped_counts_are_not_kept(self):
+        pitch = make_pitch('Capped')
+        pitch.add_clap(self.users[0], Clap.MAX_CLAPS)
+        buffer = ClapBuffer(flush_interval_ms=60000, max_events=1000)
+
+        result = buffer.add(self.users[0], pitch, 1)
+
+        self.assertEqual(result['user_claps'], Clap.MAX_CLAPS)
+        self.assertEqual(buffer._counts, {})
+        self.assertEqual(buffer.flush(), 0)
+
+
+@override_settings(PAGE_CACHE_ENABLED=False, QUERY_BUDGET_ENABLED=False)
+class QueryCountTests(TestCase):
+    """
+    Pins the query count of the main pages: each stays within its
+    QUERY_BUDGETS entry, repeats no statement more than
+    QUERY_BUDGET_MAX_DUPLICATES times, and does not grow with the number of
+    pitches, categories and claims it lists.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('founder', password='x')
+        cls.categories = [Category.objects.create(name=f"Category {i}") for i in range(3)]
+        cls.seeded = 0
+        cls.seed(6)
+
+    @classmethod
+    def seed(cls, count):
+        for _ in range(count):
+            cls.seeded += 1
+            pitch = make_pitch(f"Pitch{cls.seeded}", category=cls.categories[cls.seeded % len(cls.categories)])
+            if cls.seeded % 2:
+                Claim.objects.create(user=cls.user, pitch=pitch)
+
+    def measure(self, view_name, url, login=False):
+        if login:
+            self.client.force_login(self.user)
+        # Cold caches: the listing and context processor caches would hide the real count
+        cache.clear()
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(view_name, getattr(settings, 'QUERY_BUDGET_DEFAULT', None))
+        with query_budget(budget, getattr(settings, 'QUERY_BUDGET_MAX_DUPLICATES', None), label=view_name) as recorder:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return recorder.count
+
+    def assert_constant_queries(self, view_name, url, login=False):
+        # Warm-up, unmeasured: one-off lookups (the Sites framework's current site) stay cached across requests
+        if login:
+            self.client.force_login(self.user)
+        self.client.get(url)
+        before = self.measure(view_name, url, login)
+        self.seed(12)
+        after = self.measure(view_name, url, login)
+        self.assertEqual(before, after, f"{view_name} query count grows with the data ({before} -> {after})")
+
+    def test_index(self):
+        self.assert_constant_queries('index', reverse('index'))
+
+    def test_pitches(self):
+        self.assert_constant_queries('pitches', reverse('pitches'))
+
+    def test_leaderboard(self):
+        self.assert_constant_queries('leaderboard', reverse('leaderboard'))
+
+    def test_detail(self):
+        slug = Pitch.objects.order_by('-rank').values_list('slug', flat=True).first()
+        self.assert_constant_queries('detail', reverse('detail', args=[slug]))
+
+    def test_categories(self):
+        self.assert_constant_queries('categories', reverse('categories'))
+
+    def test_category_detail(self):
+        self.assert_constant_queries('category_detail', reverse('category_detail', args=[self.categories[0].slug]))
+
+    def test_dashboard(self):
+        self.assert_constant_queries('dashboard', reverse('dashboard'), login=True)
+
+    def test_sitemap(self):
+        self.assert_constant_queries('sitemap', reverse('sitemap'))
@@ -0,0 +1,70 @@
+# cache_versions.py
+"""
+Namespaced cache versions.
+
+Cached data is stored under a key that embeds its namespace's current
+version number. Invalidating a namespace means bumping that number, so every
+entry built from the old data stops being read at once; nothing has to be
+deleted. The old entries expire through their own timeouts. Versions live in
+the cache and are bumped after the surrounding transaction commits, so a
+reader never caches data that is about to be rolled back under the new
+version.
+
+Versions are only as shared as the default cache. With LocMemCache every
+worker process has its own, so a bump reaches just the process that made
+the change and the others keep serving old entries until they expire; the
+listing and page caches are therefore off by default unless a shared backend
+is configured (LISTING_CACHE_ENABLED, PAGE_CACHE_ENABLED).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_TIMEOUT = None  # versions never expire on their own
+
+
+def _version_key(namespace):
+    return f"cache-version:{namespace}"
+
+
+def get_version(namespace):
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        cache.add(_version_key(namespace), 1, VERSION_TIMEOUT)
+        version = cache.get(_version_key(namespace), 1)
+    return version
+
+
+def _bump(namespace):
+    try:
+        cache.incr(_version_key(namespace))
+    except ValueError:
+        # Not set yet (or evicted): any value other than the default invalidates
+        cache.set(_version_key(namespace), 2, VERSION_TIMEOUT)
+
+
+def bump_version(*namespaces):
+    """Invalidate every entry of the given namespaces once the current transaction commits."""
+    for namespace in namespaces:
+        transaction.on_commit(lambda namespace=namespace: _bump(namespace))
+
+
+def versioned_key(namespace, *parts):
+    """Cache key for parts under the current version of namespace."""
+    suffix = ':'.join(str(part) for part in parts)
+    return f"{namespace}:v{get_version(namespace)}:{suffix}"
+
+
+def cached(namespace, parts, build, timeout):
+    """
+    Return the cached value for (namespace, parts), building and storing it on
+    a miss. Always builds when LISTING_CACHE_ENABLED is False.
+    """
+    if not getattr(settings, 'LISTING_CACHE_ENABLED', True):
+        return build()
+    key = versioned_key(namespace, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
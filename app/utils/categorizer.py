@@ -4,11 +4,12 @@ from google import genai
 from google.genai.types import Tool, GenerateContentConfig, GoogleSearch
 import re
 import json
-import requests
 from bs4 import BeautifulSoup
 import time
 from datetime import datetime
 
+from .http_cache import cached_request
+
 class PitchCategorizer:
     def __init__(self):
         self.api_key = config("GEMINI_API_KEY")
@@ -44,7 +45,7 @@ class PitchCategorizer:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
             }
-            response = requests.get(url, timeout=10, headers=headers)
+            response = cached_request('GET', url, timeout=10, headers=headers)
             soup = BeautifulSoup(response.text, 'html.parser')
             
             # Remove script and style elements
@@ -0,0 +1,84 @@
+# claim_matcher.py
+"""
+Set-based claim matching for onboarding.
+
+Pitches mentioning a handle are found with one indexed lookup on
+Mention.handle_lower, and the pending Claim rows are written with a single
+bulk_create(ignore_conflicts=True), so pitches the user already claimed are
+left untouched. Result sets larger than CLAIM_MATCH_SYNC_LIMIT are claimed in
+a background thread so the onboarding request returns immediately.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from app.models import Claim, Mention
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_handle(handle):
+    return (handle or '').strip().lstrip('@').lower()
+
+
+def matching_pitch_ids(handle):
+    """Return the ids of every pitch with a mention by handle."""
+    return list(Mention.objects
+                .filter(handle_lower=normalize_handle(handle))
+                .order_by()
+                .values_list('pitch_id', flat=True)
+                .distinct())
+
+
+def create_pending_claims(user_id, pitch_ids, batch_size=500):
+    """
+    Create a pending Claim of user_id on each pitch, skipping existing claims.
+
+    Returns:
+        int: The number of claims submitted to the database.
+    """
+    claims = [
+        Claim(
+            user_id=user_id,
+            pitch_id=pitch_id,
+            status=Claim.PENDING,
+            verification_code=Claim.generate_verification_code(),
+        )
+        for pitch_id in pitch_ids
+    ]
+    Claim.objects.bulk_create(claims, batch_size=batch_size, ignore_conflicts=True)
+    return len(claims)
+
+
+def _create_in_background(user_id, pitch_ids):
+    try:
+        create_pending_claims(user_id, pitch_ids)
+    except Exception:
+        logger.exception("Error creating %d claims for user %s", len(pitch_ids), user_id)
+    finally:
+        # Worker threads get their own connection; don't leak it
+        connection.close()
+
+
+def match_claims(user, handle, sync_limit=None):
+    """
+    Claim every pitch mentioning handle on behalf of user.
+
+    Returns:
+        tuple: (match_count, in_background) where in_background is True when
+               the claims are being created by a background thread
+    """
+    if sync_limit is None:
+        sync_limit = getattr(settings, 'CLAIM_MATCH_SYNC_LIMIT', 500)
+
+    pitch_ids = matching_pitch_ids(handle)
+    if len(pitch_ids) <= sync_limit:
+        create_pending_claims(user.pk, pitch_ids)
+        return len(pitch_ids), False
+
+    # Start only once the surrounding transaction (if any) has committed
+    worker = threading.Thread(target=_create_in_background, args=(user.pk, pitch_ids), daemon=True)
+    transaction.on_commit(worker.start)
+    return len(pitch_ids), True
@@ -0,0 +1,171 @@
+# clap_buffer.py
+"""
+Write-behind buffer for claps.
+
+Clap bursts on a popular pitch are accumulated in process memory, keyed by
+(user, pitch), and flushed to Clap and Pitch in one batched transaction every
+CLAP_BUFFER_FLUSH_MS milliseconds or CLAP_BUFFER_MAX_EVENTS events, whichever
+comes first. The 10-claps-per-user cap is enforced in memory so the clap
+endpoint can answer immediately; Clap.advance enforces it again on flush, so
+the persisted totals are exactly what the unbuffered Pitch.add_clap would
+have written.
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from app.models import Clap, Pitch, effective_claps
+from .ranking_system import calculate_rank
+
+logger = logging.getLogger(__name__)
+
+
+class ClapBuffer:
+    def __init__(self, flush_interval_ms=500, max_events=50):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counts = {}                       # (user_id, pitch_id) -> count including pending claps
+        self._pending = defaultdict(int)        # (user_id, pitch_id) -> claps not yet written
+        self._pitch_pending = defaultdict(lambda: [0, 0])  # pitch_id -> [raw, effective] not yet written
+        self._events = 0
+        self._timer = None
+
+    def add(self, user, pitch, clap_count=1):
+        """
+        Buffer up to clap_count claps from user on pitch and return the
+        totals the pitch will have once they are flushed.
+
+        Returns:
+            dict: Same keys as Pitch.add_clap ('display_claps',
+                  'effective_claps', 'rank', 'user_claps')
+        """
+        if not user.is_authenticated:
+            return pitch.add_clap(user, clap_count)
+
+        key = (user.pk, pitch.pk)
+        stored = None
+        if key not in self._counts:
+            stored = self._stored_count(key)
+
+        with self._lock:
+            if key not in self._counts:
+                self._counts[key] = stored if stored is not None else self._stored_count(key)
+            old_count = self._counts[key]
+            new_count = min(old_count + clap_count, Clap.MAX_CLAPS)
+            if new_count > old_count:
+                self._counts[key] = new_count
+                self._pending[key] += new_count - old_count
+                pitch_pending = self._pitch_pending[pitch.pk]
+                pitch_pending[0] += new_count - old_count
+                pitch_pending[1] += effective_claps(new_count) - effective_claps(old_count)
+                self._events += 1
+            if key not in self._pending:
+                # Nothing to write (already at MAX_CLAPS): don't keep the count around
+                del self._counts[key]
+            raw_pending, effective_pending = self._pitch_pending.get(pitch.pk, (0, 0))
+            should_flush = self._events >= self.max_events
+            if self._pending and self._timer is None and not should_flush:
+                self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if should_flush:
+            self.flush()
+
+        effective = pitch.clap + effective_pending
+        return {
+            'display_claps': pitch.raw_clap_total + raw_pending,
+            'effective_claps': effective,
+            'rank': calculate_rank(pitch.total_engagement or {}, claps=effective, claimed=pitch.claimed),
+            'user_claps': new_count,
+        }
+
+    def _stored_count(self, key):
+        user_id, pitch_id = key
+        return Clap.objects.filter(user_id=user_id, pitch_id=pitch_id).values_list('count', flat=True).first() or 0
+
+    def flush(self):
+        """
+        Write every pending clap to the database in one transaction.
+
+        A failed flush is logged and its claps are queued again for the next
+        one; it never raises, since it also runs inline on the clap request.
+
+        Returns:
+            int: The number of (user, pitch) records flushed.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending = dict(self._pending)
+                pitch_pending = {pitch_id: list(totals) for pitch_id, totals in self._pitch_pending.items()}
+                self._pending.clear()
+                self._pitch_pending.clear()
+                self._events = 0
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+            if not pending:
+                return 0
+
+            try:
+                with transaction.atomic():
+                    pitch_deltas = defaultdict(lambda: [0, 0])  # pitch_id -> [effective, raw]
+                    for (user_id, pitch_id), clap_count in pending.items():
+                        old_count, new_count = Clap.advance(user_id, pitch_id, clap_count)
+                        pitch_deltas[pitch_id][0] += effective_claps(new_count) - effective_claps(old_count)
+                        pitch_deltas[pitch_id][1] += new_count - old_count
+                    for pitch_id, (delta, raw_delta) in pitch_deltas.items():
+                        if raw_delta:
+                            Pitch.apply_clap_delta(pitch_id, delta, raw_delta=raw_delta)
+            except Exception:
+                logger.exception("Error flushing clap buffer; %d records queued for retry", len(pending))
+                # Put the claps back so the next flush retries them; their counts stay cached
+                with self._lock:
+                    for key, clap_count in pending.items():
+                        self._pending[key] += clap_count
+                    for pitch_id, (raw, effective) in pitch_pending.items():
+                        self._pitch_pending[pitch_id][0] += raw
+                        self._pitch_pending[pitch_id][1] += effective
+                    if self._timer is None:
+                        self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+                        self._timer.daemon = True
+                        self._timer.start()
+                return 0
+
+            with self._lock:
+                # Written: reload counts from the database on next use so other processes' claps
+                # are seen, unless claps added meanwhile are still pending on top of them
+                for key in pending:
+                    if key not in self._pending:
+                        self._counts.pop(key, None)
+            return len(pending)
+
+    def _flush_from_timer(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            # Timer threads get their own connection; don't leak it
+            connection.close()
+
+
+clap_buffer = ClapBuffer(
+    flush_interval_ms=getattr(settings, 'CLAP_BUFFER_FLUSH_MS', 500),
+    max_events=getattr(settings, 'CLAP_BUFFER_MAX_EVENTS', 50),
+)
+
+
+def flush_clap_buffer():
+    """Flush pending claps; registered to run at interpreter shutdown."""
+    return clap_buffer.flush()
+
+
+atexit.register(flush_clap_buffer)
@@ -0,0 +1,146 @@
+# cursor_pagination.py
+"""
+Keyset (cursor) pagination.
+
+Instead of COUNT(*) plus OFFSET, each page is fetched with a WHERE clause on
+the sort key of the last row already shown, e.g. for ('-rank', '-id'):
+
+    WHERE rank < :rank OR (rank = :rank AND id < :id)
+    ORDER BY rank DESC, id DESC LIMIT per_page + 1
+
+which the rank / created_at indexes serve directly, so page 1000 costs the
+same as page 1. The position of that last row is handed to the client as an
+opaque next_cursor token, which also carries how many rows came before it so
+listings can keep numbering their rows.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# Orderings the feeds paginate on; each ends in a unique column
+RANK_ORDERING = ('-rank', '-id')
+CREATED_ORDERING = ('-created_at', '-id')
+TRENDING_ORDERING = ('-trending_score', '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorPage:
+    """One page of a keyset-paginated queryset."""
+
+    def __init__(self, object_list, next_cursor, offset):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.offset = offset  # rows shown on earlier pages
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.offset > 0
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and 'dt' in value:
+        parsed = parse_datetime(value['dt'])
+        if parsed is None:
+            raise InvalidCursor("Bad datetime in cursor")
+        return parsed
+    return value
+
+
+def _to_python(field, value):
+    """Convert one decoded cursor value for its ordering field, rejecting anything it can't hold."""
+    if value is None:
+        raise InvalidCursor("Null value in cursor")
+    try:
+        return field.to_python(value)
+    except (ValidationError, TypeError, ValueError) as e:
+        raise InvalidCursor(f"Bad value for {field.name} in cursor") from e
+
+
+def encode_cursor(values, offset):
+    payload = json.dumps({'k': [_encode_value(value) for value in values], 'n': offset},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, ordering, model):
+    """
+    Return (values, offset) from a next_cursor token for ordering on model,
+    each value converted by its field's to_python(). Raises InvalidCursor if
+    the token is malformed or a value doesn't fit its field.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [_decode_value(value) for value in payload['k']]
+        offset = int(payload['n'])
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(str(e)) from e
+    if len(values) != len(ordering) or offset < 0:
+        raise InvalidCursor("Cursor does not match this ordering")
+    fields = [model._meta.get_field(field.lstrip('-')) for field in ordering]
+    return [_to_python(field, value) for field, value in zip(fields, values)], offset
+
+
+def _after(ordering, values):
+    """Q selecting the rows that sort after the row whose key is values."""
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def _key_value(row, name):
+    # Rows are model instances, or dicts from a values() projection
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def cursor_paginate(queryset, ordering, cursor=None, per_page=20):
+    """
+    Return the CursorPage of queryset that follows cursor (the first page
+    when cursor is empty).
+
+    ordering is a tuple of field names, '-' for descending, ending in a
+    unique field (see RANK_ORDERING); a values() queryset must select them.
+    Raises InvalidCursor for a token that was not produced for this ordering.
+    """
+    queryset = queryset.order_by(*ordering)
+    offset = 0
+    if cursor:
+        values, offset = decode_cursor(cursor, ordering, queryset.model)
+        queryset = queryset.filter(_after(ordering, values))
+
+    rows = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            [_key_value(last, field.lstrip('-')) for field in ordering],
+            offset + per_page,
+        )
+    return CursorPage(rows, next_cursor, offset)
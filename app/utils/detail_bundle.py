@@ -0,0 +1,129 @@
+# detail_bundle.py
+"""
+Precomputed detail page bundle.
+
+Everything views.detail derives from a pitch's own row - SEO meta,
+JSON-LD structured data, the first mention's engagement and source, the
+latest mention, engagement totals and the ids of its related pitches - is
+built once and cached under a key made of the pitch id and the columns it
+depends on (updated_at, rank, clap). Any save moves updated_at and a clap
+moves clap/rank, so a changed pitch simply misses and rebuilds. Nothing has
+to be invalidated explicitly. The related-pitches graph version is part of
+the key too, so rebuilding the graph refreshes the neighbour ids.
+"""
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Value, When
+
+from app.models import Pitch
+from .cache_versions import get_version
+from .ranking_system import coerce_pitch_data
+from .related_graph import RELATED_NAMESPACE, stored_related_ids
+
+RELATED_LIMIT = 10
+
+
+def bundle_key(pitch):
+    return (f"detail-bundle:{pitch.pk}:{pitch.updated_at.timestamp()}:{pitch.rank}:{pitch.clap}"
+            f":g{get_version(RELATED_NAMESPACE)}")
+
+
+def related_pitch_ids(pitch, limit=RELATED_LIMIT):
+    """
+    Ids of pitches in the same category first, then any others, each best
+    ranked first like the related graph's tie-break, in a single query. Used
+    until the related graph covers pitch.
+    """
+    same_category = When(category__isnull=True, then=Value(0)) if pitch.category_id is None \
+        else When(category_id=pitch.category_id, then=Value(0))
+    return list(Pitch.objects
+                .exclude(id=pitch.id)
+                .annotate(other_category=Case(same_category, default=Value(1), output_field=IntegerField()))
+                .order_by('other_category', '-rank', '-id')
+                .values_list('id', flat=True)[:limit])
+
+
+def build_detail_bundle(pitch):
+    """Compute the request-independent part of the detail page context."""
+    mentions = [mention for mention in coerce_pitch_data(pitch.pitch_data) if isinstance(mention, dict)]
+    first_entry = mentions[0] if mentions else {}
+    author = first_entry.get('user') or {}
+
+    engagement_data = first_entry.get("engagement", {}) if first_entry else {}
+    source_data = {}
+    if first_entry:
+        source_data = {
+            'user': author,
+            'timestamp': first_entry.get("timestamp", {}),
+            'tweet_text': first_entry.get("tweetText", ""),
+            'reply_link': first_entry.get("replyLink", ""),
+            'links': first_entry.get("links", [])
+        }
+
+    meta_data = {
+        'title': f"{pitch.name} | PitchedLink",
+        'description': pitch.description[:160] if pitch.description else f"Discover {pitch.name}, a trending startup pitch on PitchedLink. View details, rankings, and engagement metrics.",
+        'keywords': f"{pitch.name}, startup pitch, {pitch.category or 'software'}, trending startups, pitch deck",
+        'og_image': pitch.banner_url or pitch.icon_url,
+        'og_type': 'article',
+        'twitter_card': 'summary_large_image',
+    }
+
+    structured_data = {
+        "@context": "https://schema.org",
+        "@type": "SoftwareApplication",
+        "name": pitch.name,
+        "operatingSystem": "All",
+        "applicationCategory": (pitch.category.name if pitch.category else None) or "WebApplication",
+        "description": pitch.description or f"Discover {pitch.name}, a trending SaaS tool.",
+        "url": pitch.url,
+        "image": pitch.banner_url or pitch.icon_url,
+        "aggregateRating": {
+            "@type": "AggregateRating",
+            "ratingValue": min(5, max(1, 5 - (pitch.rank / 20))),
+            "reviewCount": max(1, pitch.clap),
+            "bestRating": 5,
+            "worstRating": 1
+        },
+        "offers": {
+            "@type": "Offer",
+            "price": "0",  # If free trial or unknown, keep 0
+            "priceCurrency": "USD",
+            "availability": "https://schema.org/InStock" if pitch.is_launched else "https://schema.org/PreOrder"
+        },
+        "author": {
+            "@type": "Person",
+            "name": author.get('name'),
+            "url": f"https://x.com/{author.get('handle')}"
+        },
+        "datePublished": pitch.updated_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+    }
+
+    return {
+        'engagement_data': engagement_data,
+        'source_data': source_data,
+        'meta_data': meta_data,
+        'structured_data': json.dumps(structured_data),
+        'latest_mention': pitch.get_latest_mention(),
+        'total_engagement': pitch.get_engagement_data(),
+        # Precomputed graph when built, live query for pitches it doesn't cover yet
+        'related_pitch_ids': stored_related_ids(pitch) or related_pitch_ids(pitch),
+    }
+
+
+def get_detail_bundle(pitch):
+    """The cached bundle for pitch, built on first use after any change to it."""
+    key = bundle_key(pitch)
+    bundle = cache.get(key)
+    if bundle is None:
+        bundle = build_detail_bundle(pitch)
+        cache.set(key, bundle, getattr(settings, 'DETAIL_BUNDLE_TIMEOUT', 3600))
+    return bundle
+
+
+def related_pitches(ids):
+    """Fetch the related pitches in one query, in the order of ids."""
+    by_id = Pitch.objects.select_related('category').in_bulk(ids)
+    return [by_id[pitch_id] for pitch_id in ids if pitch_id in by_id]
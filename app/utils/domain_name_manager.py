@@ -14,6 +14,8 @@
 import requests
 from urllib.parse import urlparse
 
+from .http_cache import cached_request
+
 # Blacklist of promotional/launch domains and patterns
 PROMOTIONAL_DOMAINS = {
     'producthunt.com', 'betalist.com', 'launchingnext.com', 'startuptracker.io',
@@ -73,8 +75,8 @@ def get_final_url(url, max_redirects=10):
     """
     try:
         # Use HEAD request first (faster, only gets headers)
-        response = requests.head(url, allow_redirects=True, timeout=10, 
-                               headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'})
+        response = cached_request('HEAD', url, allow_redirects=True, timeout=10,
+                                  headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'})
         
         # Check if we got blocked by Cloudflare or similar
         if is_blocked_response(response):
@@ -85,8 +87,8 @@ def get_final_url(url, max_redirects=10):
     except requests.exceptions.RequestException as e:
         try:
             # Fallback to GET request if HEAD fails
-            response = requests.get(url, allow_redirects=True, timeout=10,
-                                  headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'})
+            response = cached_request('GET', url, allow_redirects=True, timeout=10,
+                                      headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'})
             
             # Check if we got blocked by Cloudflare or similar
             if is_blocked_response(response):
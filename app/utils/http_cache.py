@@ -0,0 +1,318 @@
+# http_cache.py
+"""
+Persistent HTTP response cache shared by the site scrapers.
+
+get_site_metadata, PitchCategorizer.scrape_website_content and
+get_final_url all go through cached_request(), so a site that several
+mentions point to is downloaded once. The async batch fetcher
+(fetch_sites_metadata) reads and writes the same entries through
+fresh_response() and store_response(). Responses are stored in a SQLite file
+(HTTP_CACHE_PATH) keyed by method and URL, along with their status, final
+URL after redirects, headers, ETag and Last-Modified. get_site_metadata only
+needs the <head>, so it streams the page and stores just that, as a 'head'
+variant of the URL.
+
+An entry is fresh for the lifetime given by its Cache-Control max-age or
+Expires header, or HTTP_CACHE_TTL seconds when the server says nothing.
+Fresh entries are served without touching the network. Stale ones are
+revalidated with If-None-Match / If-Modified-Since: on a 304 the stored body
+is served and its lifetime renewed, anything else replaces it. no-store
+responses are never written. The file is kept under HTTP_CACHE_MAX_BYTES by
+evicting the least recently used entries.
+
+The cache is best effort: a SQLite error is logged and the request goes to
+the network as if the cache were disabled.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from django.conf import settings
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth keeping; errors and partial content are always refetched
+CACHEABLE_STATUSES = {200, 203, 300, 301, 308, 404, 410}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_idx ON responses (accessed_at);
+"""
+
+
+def parse_cache_control(value):
+    """'max-age=60, no-cache' -> {'max-age': '60', 'no-cache': None}"""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else None
+    return directives
+
+
+def freshness_lifetime(headers, default_ttl):
+    """Seconds a response stays fresh, 0 to always revalidate, None if it must not be stored."""
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0
+    if 'max-age' in directives:
+        try:
+            return max(0, int(directives['max-age']))
+        except (TypeError, ValueError):
+            return 0
+    if headers.get('Expires'):
+        try:
+            expires = parsedate_to_datetime(headers['Expires']).timestamp()
+            date = parsedate_to_datetime(headers['Date']).timestamp() if headers.get('Date') else time.time()
+        except (TypeError, ValueError):
+            # Unparseable (e.g. "0") means already expired
+            return 0
+        return max(0, expires - date)
+    return default_ttl
+
+
+def build_response(status, url, headers, body):
+    """A requests.Response carrying a stored entry, so callers can't tell it from a live one."""
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = body
+    response._content_consumed = True
+    response.from_cache = True
+    return response
+
+
+class HttpCache:
+    """SQLite-backed response store; one connection per thread."""
+
+    def __init__(self, path, max_bytes, ttl):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def lookup(self, key):
+        """The stored row for key as a dict, or None."""
+        row = self._connection().execute(
+            'SELECT status, url, headers, body, etag, last_modified, expires_at FROM responses WHERE key = ?',
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        status, url, headers, body, etag, last_modified, expires_at = row
+        return {
+            'status': status, 'url': url, 'headers': json.loads(headers), 'body': body,
+            'etag': etag, 'last_modified': last_modified, 'expires_at': expires_at,
+        }
+
+    def touch(self, key, expires_at=None, headers=None):
+        """Mark key as just used, renewing its lifetime and headers after a 304."""
+        connection = self._connection()
+        with connection:
+            if expires_at is None:
+                connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            else:
+                connection.execute(
+                    'UPDATE responses SET accessed_at = ?, expires_at = ?, headers = ? WHERE key = ?',
+                    (time.time(), expires_at, json.dumps(headers), key),
+                )
+
+    def store(self, key, response, lifetime):
+        body = response.content or b''
+        headers = dict(response.headers)
+        size = len(body) + len(key) + len(json.dumps(headers))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, response.status_code, response.url, json.dumps(headers), body,
+                 response.headers.get('ETag'), response.headers.get('Last-Modified'), now + lifetime, now, size),
+            )
+            self._evict(connection)
+
+    def _evict(self, connection):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in connection.execute('SELECT key, size FROM responses ORDER BY accessed_at'):
+            victims.append((key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        connection.executemany('DELETE FROM responses WHERE key = ?', victims)
+
+    def clear(self):
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM responses')
+
+    def _fresh(self, keys):
+        """(key, entry) of the first fresh entry among keys, else (None, None)."""
+        for key in keys:
+            entry = self.lookup(key)
+            if entry is not None and entry['expires_at'] > time.time():
+                return key, entry
+        return None, None
+
+    @staticmethod
+    def _keys(method, url, variant=''):
+        """Keys to look url up under: the variant's own first, then the full copy."""
+        key = f"{method.upper()} {url}"
+        return [f"{key} #{variant}", key] if variant else [key]
+
+    def fresh_response(self, method, url, variant=''):
+        """
+        A fresh stored response for url, or None, for clients that do their
+        own fetching (the async batch fetcher); stale entries are not
+        revalidated here.
+        """
+        try:
+            fresh_key, entry = self._fresh(self._keys(method, url, variant))
+            if entry is None:
+                return None
+            self.touch(fresh_key)
+        except sqlite3.Error as e:
+            logger.warning("HTTP cache unavailable: %s", e)
+            return None
+        return build_response(entry['status'], entry['url'], entry['headers'], entry['body'])
+
+    def store_response(self, method, url, response, variant=''):
+        """Store a response fetched outside request() (see build_response), if it is cacheable."""
+        lifetime = freshness_lifetime(response.headers, self.ttl)
+        if response.status_code not in CACHEABLE_STATUSES or lifetime is None:
+            return
+        try:
+            self.store(self._keys(method, url, variant)[0], response, lifetime)
+        except sqlite3.Error as e:
+            logger.warning("HTTP cache write failed for %s: %s", url, e)
+
+    def request(self, method, url, session=None, variant='', read_body=None, **kwargs):
+        """
+        session.request(method, url, **kwargs) through the cache. Network
+        errors propagate exactly as without it.
+
+        variant names a partial copy of the response (e.g. 'head'), stored
+        under its own key: the response is streamed and read_body(response)
+        returns the bytes to keep, so nothing past them is downloaded. A
+        fresh full copy of the same URL serves a variant too.
+        """
+        http = session or requests
+        method = method.upper()
+        keys = self._keys(method, url, variant)
+
+        try:
+            fresh_key, entry = self._fresh(keys)
+            if entry is None:
+                entry = self.lookup(keys[0])
+        except sqlite3.Error as e:
+            logger.warning("HTTP cache unavailable: %s", e)
+            return _fetch(http, method, url, read_body, **kwargs)
+
+        if fresh_key is not None:
+            try:
+                self.touch(fresh_key)
+            except sqlite3.Error as e:
+                logger.warning("HTTP cache write failed for %s: %s", url, e)
+            return build_response(entry['status'], entry['url'], entry['headers'], entry['body'])
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = _fetch(http, method, url, read_body, headers=headers, **kwargs)
+
+        try:
+            if response.status_code == 304 and entry is not None:
+                merged = CaseInsensitiveDict(entry['headers'])
+                merged.update(response.headers)
+                lifetime = freshness_lifetime(merged, self.ttl) or 0
+                self.touch(keys[0], time.time() + lifetime, dict(merged))
+                return build_response(entry['status'], entry['url'], merged, entry['body'])
+            lifetime = freshness_lifetime(response.headers, self.ttl)
+            if response.status_code in CACHEABLE_STATUSES and lifetime is not None:
+                self.store(keys[0], response, lifetime)
+        except sqlite3.Error as e:
+            logger.warning("HTTP cache write failed for %s: %s", url, e)
+        response.from_cache = False
+        return response
+
+
+def _fetch(http, method, url, read_body=None, **kwargs):
+    """Make the request; with read_body, stream it and keep only the bytes read_body returns."""
+    if read_body is None:
+        return http.request(method, url, **kwargs)
+    response = http.request(method, url, stream=True, **kwargs)
+    try:
+        body = read_body(response)
+    finally:
+        # Drops the connection if the body was cut short, returns it to the pool otherwise
+        response.close()
+    response._content = body
+    response._content_consumed = True
+    return response
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_http_cache():
+    """The process-wide HttpCache configured by the HTTP_CACHE_* settings."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = HttpCache(
+                    getattr(settings, 'HTTP_CACHE_PATH', 'http_cache.sqlite3'),
+                    getattr(settings, 'HTTP_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+                    getattr(settings, 'HTTP_CACHE_TTL', 6 * 3600),
+                )
+    return _cache
+
+
+def http_cache_enabled():
+    return getattr(settings, 'HTTP_CACHE_ENABLED', True)
+
+
+def cached_request(method, url, session=None, variant='', read_body=None, **kwargs):
+    """Make a request through the shared cache, or directly when HTTP_CACHE_ENABLED is False."""
+    if not http_cache_enabled():
+        return _fetch(session or requests, method, url, read_body, **kwargs)
+    return get_http_cache().request(method, url, session=session, variant=variant, read_body=read_body, **kwargs)
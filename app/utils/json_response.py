@@ -0,0 +1,16 @@
+# json_response.py
+"""
+JsonResponse backed by orjson.
+
+orjson serializes dicts, lists, datetimes and UUIDs natively and several
+times faster than the stdlib encoder JsonResponse uses, which matters for
+the paginated feeds that are hit on every infinite-scroll step.
+"""
+import orjson
+from django.http import HttpResponse
+
+
+class FastJsonResponse(HttpResponse):
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS), **kwargs)
@@ -0,0 +1,121 @@
+# listings.py
+"""
+Query builders for the pitch listing pages.
+"""
+from django.conf import settings
+from django.db.models import Count, F, Window
+from django.db.models.fields.json import KeyTransform
+from django.db.models.functions import RowNumber
+
+from app.models import Category, Pitch
+from .cache_versions import bump_version, cached
+
+# Namespaces bumped whenever ranks or categories change (see invalidate_listings)
+CATEGORIES_NAMESPACE = 'categories'
+NAV_CATEGORIES_NAMESPACE = 'nav-categories'
+FEATURED_NAMESPACE = 'featured'
+PAGES_NAMESPACE = 'pages'  # rendered anonymous pages, see page_cache
+LISTING_NAMESPACES = (CATEGORIES_NAMESPACE, NAV_CATEGORIES_NAMESPACE, FEATURED_NAMESPACE, PAGES_NAMESPACE)
+
+
+def invalidate_listings():
+    """Drop every cached listing once the current transaction commits."""
+    bump_version(*LISTING_NAMESPACES)
+
+
+# Columns the JSON pitches feed serializes; everything else (content, seo_data,
+# meta_data, the pitch_data list) stays in the database
+FEED_FIELDS = (
+    'id', 'slug', 'name', 'title', 'description', 'banner_url', 'url', 'icon_url',
+    'mention_count', 'rank', 'clap', 'created_at', 'updated_at', 'claimed',
+)
+
+
+def feed_values(queryset):
+    """
+    Project queryset onto the feed columns, the category name (joined) and
+    only the first pitch_data mention, extracted in SQL (pitch_data -> 0).
+    """
+    return (queryset
+            .annotate(category_name=F('category__name'), first_mention=KeyTransform('0', 'pitch_data'))
+            .values(*FEED_FIELDS, 'category_name', 'first_mention'))
+
+
+def top_pitches_by_category(per_category=5):
+    """
+    Build the categories page from a single query.
+
+    ROW_NUMBER() OVER (PARTITION BY category ORDER BY rank DESC) picks the top
+    per_category pitches of every category and COUNT(*) over the same
+    partition gives its size; the categories themselves come in through
+    select_related.
+
+    Returns:
+        list: Category objects ordered by name, each with pitch_count and
+              top_pitches set.
+    """
+    partition = {'partition_by': [F('category_id')]}
+    rows = (Pitch.objects
+            .filter(category__isnull=False)
+            .select_related('category')
+            .annotate(
+                category_position=Window(RowNumber(), order_by=[F('rank').desc(), F('id').desc()], **partition),
+                category_size=Window(Count('id'), **partition),
+            )
+            .filter(category_position__lte=per_category)
+            .order_by('category__name', 'category_position'))
+
+    categories = {}
+    for pitch in rows:
+        category = categories.get(pitch.category_id)
+        if category is None:
+            category = pitch.category
+            category.pitch_count = pitch.category_size
+            category.top_pitches = []
+            categories[pitch.category_id] = category
+        category.top_pitches.append(pitch)
+    return list(categories.values())
+
+
+def cached_top_pitches_by_category(per_category=5):
+    """top_pitches_by_category, cached until ranks or categories change."""
+    return cached(
+        CATEGORIES_NAMESPACE,
+        ['top', per_category],
+        lambda: top_pitches_by_category(per_category),
+        getattr(settings, 'CATEGORIES_CACHE_TIMEOUT', 300),
+    )
+
+
+def categories_with_pitches():
+    """Every category that has at least one pitch, ordered by name."""
+    return list(Category.objects
+                .filter(pitches__isnull=False)
+                .distinct()
+                .order_by('name'))
+
+
+def cached_categories_with_pitches():
+    return cached(
+        NAV_CATEGORIES_NAMESPACE,
+        ['all'],
+        categories_with_pitches,
+        getattr(settings, 'CATEGORIES_CACHE_TIMEOUT', 300),
+    )
+
+
+def featured_pitches(limit=2):
+    """The highest ranked featured pitches."""
+    return list(Pitch.objects
+                .filter(is_featured=True)
+                .select_related('category')
+                .order_by('-rank')[:limit])
+
+
+def cached_featured_pitches(limit=2):
+    return cached(
+        FEATURED_NAMESPACE,
+        ['top', limit],
+        lambda: featured_pitches(limit),
+        getattr(settings, 'FEATURED_CACHE_TIMEOUT', 300),
+    )
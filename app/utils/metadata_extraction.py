@@ -1,7 +1,23 @@
 
+import asyncio
+import codecs
+import logging
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+
+import httpx
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+
+from .http_cache import build_response, cached_request, get_http_cache, http_cache_enabled
+
+logger = logging.getLogger(__name__)
+
+# Shared session so repeated calls reuse connections to the same host
+session = requests.Session()
+
+# Statuses worth retrying in the batch fetcher
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 
 def get_meta_value(soup, keys):
@@ -16,52 +32,316 @@ def get_meta_value(soup, keys):
             return tag.get("content").strip()
     return None
 
-def get_site_metadata(url):
-    """Fetches the site and parses its metadata using BeautifulSoup."""
-    
-    try:
-        print(f"Fetching metadata for URL: {url}")
-        response = requests.get(url, timeout=5)
-        print(f"Response status code: {response.status_code}")
-    except requests.RequestException:
-        print(f"Failed to fetch URL: {url}")
-        return None
+def ensure_absolute_url(base, url):
+    # If the URL doesn't start with 'http', assume it's relative and join it with the base.
+    if not url.startswith("http"):
+        return urljoin(base, url)
+    return url
 
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    def ensure_absolute_url(base, url):
-        # If the URL doesn't start with 'http', assume it's relative and join it with the base.
-        if not url.startswith("http"):
-            return urljoin(base, url)
-        return url
+def assemble_metadata(url, meta_value, title, icon_href):
+    """
+    Build the get_site_metadata dict.
 
-    # In your metadata extraction function:
+    meta_value(keys) returns the first non-empty content for a list of
+    (attribute, value) pairs, title is the <title> string (or None) and
+    icon_href the href of the first rel=icon link (or None).
+    """
     metadata = {
-        "title": get_meta_value(soup, [
+        "title": meta_value([
                     ("property", "og:title"),
                     ("name", "twitter:title"),
                     ("name", "title")
-                ]) or (soup.title.string.strip() if soup.title and soup.title.string else url),
-        "description": get_meta_value(soup, [
+                ]) or (title.strip() if title else url),
+        "description": meta_value([
                     ("property", "og:description"),
                     ("name", "description"),
                     ("name", "twitter:description")
                 ]) or "",
-        "image": ensure_absolute_url(url, get_meta_value(soup, [
+        "image": ensure_absolute_url(url, meta_value([
                     ("property", "og:image"),
                     ("name", "twitter:image")
                 ]) or ""),
-        "url": get_meta_value(soup, [
+        "url": meta_value([
                     ("property", "og:url"),
                     ("name", "twitter:url")
                 ]) or url,
     }
-    
+
     # Extract favicon
-    icon_tag = soup.find("link", rel="icon") or soup.find("link", rel="shortcut icon")
-    if icon_tag and icon_tag.get("href"):
-        metadata["icon"] = urljoin(url, icon_tag["href"])
-    else:
-        metadata["icon"] = ""
-    
+    metadata["icon"] = urljoin(url, icon_href) if icon_href else ""
     return metadata
+
+def parse_site_metadata(html, url):
+    """Parse the metadata dict of get_site_metadata out of a whole page with BeautifulSoup."""
+    soup = BeautifulSoup(html, 'html.parser')
+    icon_tag = soup.find("link", rel="icon") or soup.find("link", rel="shortcut icon")
+    return assemble_metadata(
+        url,
+        lambda keys: get_meta_value(soup, keys),
+        soup.title.string if soup.title else None,
+        icon_tag.get("href") if icon_tag else None,
+    )
+
+
+# Stop reading a page after this many bytes even if </head> has not been seen
+MAX_HEAD_BYTES = 256 * 1024
+
+
+class HeadMetadataParser(HTMLParser):
+    """
+    Incremental parser collecting, in one pass, what assemble_metadata needs:
+    every <meta> keyed by (attribute, value) for its property/name attributes
+    (first tag wins, like soup.find), the first <title> and the first
+    rel=icon link. done becomes True at </head> or <body>.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta = {}
+        self.title = None
+        self.icon_href = None
+        self.done = False
+        self._icon_seen = False
+        self._title_seen = False
+        self._title_parts = None
+
+    def handle_starttag(self, tag, attrs):
+        # Later duplicates win and valueless attributes are '', as in BeautifulSoup
+        attrs = {name: value if value is not None else '' for name, value in attrs}
+        if tag == 'meta':
+            for attr in ('property', 'name'):
+                if attr in attrs:
+                    self.meta.setdefault((attr, attrs[attr]), attrs.get('content'))
+        elif tag == 'link':
+            if not self._icon_seen and 'icon' in attrs.get('rel', '').split():
+                self._icon_seen = True
+                self.icon_href = attrs.get('href')
+        elif tag == 'title':
+            if not self._title_seen:
+                self._title_seen = True
+                self._title_parts = []
+        elif tag == 'body':
+            self.done = True
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == 'title' and self._title_parts is not None:
+            self.title = ''.join(self._title_parts) or None
+            self._title_parts = None
+        elif tag == 'head':
+            self.done = True
+
+    def meta_value(self, keys):
+        """get_meta_value over the collected tags: O(1) per key instead of a tree scan."""
+        for key in keys:
+            content = self.meta.get(key)
+            if content:
+                return content.strip()
+        return None
+
+    def metadata(self, url):
+        if self._title_parts is not None:
+            # Cut off inside <title>
+            self.title = ''.join(self._title_parts) or None
+        return assemble_metadata(url, self.meta_value, self.title, self.icon_href)
+
+
+def _feed_head(parser, chunks, encoding, max_bytes=MAX_HEAD_BYTES):
+    """
+    Decode raw byte chunks with encoding and feed them to parser until the
+    head ends or max_bytes bytes have been read. Returns the chunks consumed.
+    """
+    decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+    consumed = []
+    size = 0
+    for chunk in chunks:
+        consumed.append(chunk)
+        parser.feed(decoder.decode(chunk))
+        size += len(chunk)
+        if parser.done or size >= max_bytes:
+            return consumed
+    parser.feed(decoder.decode(b'', final=True))
+    return consumed
+
+
+def parse_head_metadata(chunks, url, encoding='utf-8', max_bytes=MAX_HEAD_BYTES):
+    """
+    Feed raw byte chunks to a HeadMetadataParser until the head ends or
+    max_bytes have been read, and return the get_site_metadata dict.
+    """
+    parser = HeadMetadataParser()
+    _feed_head(parser, chunks, encoding, max_bytes)
+    return parser.metadata(url)
+
+
+def read_head_bytes(response, chunk_size=8192):
+    """
+    Read a streamed response only as far as HeadMetadataParser needs (</head>,
+    <body> or MAX_HEAD_BYTES) and return those bytes, for the HTTP cache.
+    """
+    chunks = _feed_head(HeadMetadataParser(), response.iter_content(chunk_size=chunk_size), response.encoding)
+    return b''.join(chunks)
+
+
+def get_site_metadata(url, head_only=True):
+    """
+    Fetches the site and parses its metadata.
+
+    With head_only the response is streamed and parsed incrementally until
+    </head> (at most MAX_HEAD_BYTES), and only those bytes are downloaded
+    and cached; otherwise the whole page is fetched and parsed with
+    BeautifulSoup.
+    """
+
+    try:
+        logger.debug("Fetching metadata for URL: %s", url)
+        if not http_cache_enabled():
+            response = session.get(url, timeout=5, stream=head_only)
+        elif head_only:
+            response = cached_request('GET', url, session=session, variant='head',
+                                      read_body=read_head_bytes, timeout=5)
+        else:
+            response = cached_request('GET', url, session=session, timeout=5)
+        logger.debug("Response status code: %s", response.status_code)
+    except requests.RequestException:
+        logger.info("Failed to fetch URL: %s", url)
+        return None
+
+    if not head_only:
+        return parse_site_metadata(response.text, url)
+    try:
+        return parse_head_metadata(response.iter_content(chunk_size=8192), url, response.encoding)
+    except requests.RequestException:
+        logger.info("Failed to read URL: %s", url)
+        return None
+    finally:
+        # Drops the connection if the body was cut short, returns it to the pool otherwise
+        response.close()
+
+
+class FetchLimits:
+    """A global concurrency limit plus one per host."""
+
+    def __init__(self, concurrency, per_host):
+        self.all = asyncio.Semaphore(concurrency)
+        self.per_host = per_host
+        self.hosts = {}
+
+    def host(self, url):
+        host = urlparse(url).netloc.lower()
+        if host not in self.hosts:
+            self.hosts[host] = asyncio.Semaphore(self.per_host)
+        return self.hosts[host]
+
+
+async def _read_body(response, head_only):
+    """
+    (body, raw): the whole body text and bytes, or with head_only a
+    HeadMetadataParser fed up to the end of <head> and the bytes it read.
+    """
+    if not head_only:
+        await response.aread()
+        return response.text, response.content
+    parser = HeadMetadataParser()
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    chunks = []
+    consumed = 0
+    async for chunk in response.aiter_bytes():
+        chunks.append(chunk)
+        parser.feed(decoder.decode(chunk))
+        # Raw bytes, like read_head_bytes: MAX_HEAD_BYTES bounds the download
+        consumed += len(chunk)
+        if parser.done or consumed >= MAX_HEAD_BYTES:
+            return parser, b''.join(chunks)
+    parser.feed(decoder.decode(b'', final=True))
+    return parser, b''.join(chunks)
+
+
+async def fetch_html(client, url, limits, retries=2, backoff=0.5, head_only=False):
+    """
+    GET url within the concurrency limits, retrying transport errors,
+    timeouts and RETRY_STATUSES with exponential backoff.
+    Returns (response, body, raw) with the body text (a fed HeadMetadataParser
+    with head_only) and the raw bytes read, or None if every attempt failed.
+    """
+    async with limits.all, limits.host(url):
+        for attempt in range(retries + 1):
+            try:
+                async with client.stream('GET', url) as response:
+                    if response.status_code not in RETRY_STATUSES or attempt == retries:
+                        body, raw = await _read_body(response, head_only)
+                        return response, body, raw
+            except httpx.HTTPError as e:
+                if attempt == retries:
+                    logger.info("Failed to fetch URL: %s (%s)", url, e)
+                    return None
+            await asyncio.sleep(backoff * (2 ** attempt))
+    return None
+
+
+def _stored_metadata(response, url, head_only):
+    """The get_site_metadata dict of a response served by the HTTP cache."""
+    if head_only:
+        return parse_head_metadata(response.iter_content(chunk_size=8192), url, response.encoding)
+    return parse_site_metadata(response.text, url)
+
+
+async def fetch_sites_metadata(urls, concurrency=20, per_host=4, timeout=5, retries=2, client=None,
+                               head_only=True):
+    """
+    Fetch and parse the metadata of many URLs concurrently.
+
+    One AsyncClient (one connection pool, reused per host) serves the whole
+    batch; at most concurrency requests are in flight overall and per_host
+    against any single host. Pages are parsed in worker threads so parsing
+    does not stall the event loop. With head_only each page is parsed while it
+    streams in and the download stops at </head>.
+
+    Fresh pages are served from the shared HTTP cache and fetched pages are
+    stored in it, under the same keys as get_site_metadata uses.
+
+    Returns:
+        dict: url -> the get_site_metadata() dict, or None if it could not be fetched
+    """
+    urls = list(dict.fromkeys(urls))
+    limits = FetchLimits(concurrency, per_host)
+    cache = get_http_cache() if http_cache_enabled() else None
+    variant = 'head' if head_only else ''
+    owns_client = client is None
+    if owns_client:
+        client = httpx.AsyncClient(
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+    async def one(url):
+        if cache is not None:
+            stored = await asyncio.to_thread(cache.fresh_response, 'GET', url, variant)
+            if stored is not None:
+                return await asyncio.to_thread(_stored_metadata, stored, url, head_only)
+        fetched = await fetch_html(client, url, limits, retries=retries, head_only=head_only)
+        if fetched is None:
+            return None
+        response, body, raw = fetched
+        if cache is not None:
+            stored = build_response(response.status_code, str(response.url), dict(response.headers), raw)
+            await asyncio.to_thread(cache.store_response, 'GET', url, stored, variant)
+        if head_only:
+            return body.metadata(url)
+        return await asyncio.to_thread(parse_site_metadata, body, url)
+
+    try:
+        results = await asyncio.gather(*(one(url) for url in urls))
+    finally:
+        if owns_client:
+            await client.aclose()
+    return dict(zip(urls, results))
+
+
+def get_sites_metadata(urls, **kwargs):
+    """Synchronous entry point to fetch_sites_metadata for views and commands."""
+    return asyncio.run(fetch_sites_metadata(urls, **kwargs))
@@ -0,0 +1,122 @@
+# page_cache.py
+"""
+Rendered-response cache for anonymous traffic.
+
+Pages (and the leaderboard's AJAX fragments) are stored whole, keyed by
+host, path, query string, device class and whether the request was an XHR.
+Each entry records the version of the 'pages' namespace it was rendered
+under; pitch or rank changes bump that version (see listings.invalidate_listings).
+
+An entry is fresh for PAGE_CACHE_TIMEOUT seconds while its version is
+current. After that, or once the version moves on, it is stale for another
+PAGE_CACHE_STALE_TIMEOUT seconds. During that window exactly one request
+(whoever takes the revalidation lock) re-renders the page, while everyone
+else is served the stale copy instead of waiting. Only the cache API is
+used (get/set/add/delete), so the file-based backend works as well as Redis
+or Memcached. Local memory only suits a single worker: the 'pages' version
+is per process there, so other workers would miss an invalidation.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from app.context_processors import mobile_hint, request_device
+from .cache_versions import get_version
+from .listings import PAGES_NAMESPACE
+
+
+def device_class(request):
+    """'mobile', 'tablet' or 'pc', from the same memoized parser as device_context."""
+    if mobile_hint(request):
+        return 'mobile'
+    device = request_device(request)
+    if device['is_mobile']:
+        return 'mobile'
+    if device['is_tablet']:
+        return 'tablet'
+    return 'pc'
+
+
+def page_cache_key(request):
+    fragment = 'xhr' if request.headers.get('X-Requested-With') == 'XMLHttpRequest' else 'page'
+    raw = '|'.join([
+        request.get_host(), request.path, request.META.get('QUERY_STRING', ''),
+        device_class(request), fragment,
+    ])
+    return f"page-cache:{hashlib.sha256(raw.encode()).hexdigest()}"
+
+
+def is_cacheable_request(request):
+    if request.method != 'GET':
+        return False
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return False
+    # Pending flash messages are rendered into the page; don't swallow them
+    return getattr(settings, 'MESSAGES_COOKIE_NAME', 'messages') not in request.COOKIES
+
+
+def is_cacheable_response(request, response):
+    return (response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            # get_token() was called while rendering: the page embeds a per-visitor CSRF token
+            and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            and not response.has_header('Vary'))
+
+
+def _store(key, response, version):
+    entry = {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'version': version,
+        'created': time.time(),
+    }
+    timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60) + getattr(settings, 'PAGE_CACHE_STALE_TIMEOUT', 600)
+    cache.set(key, entry, timeout)
+
+
+def _from_entry(entry, state):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['X-Page-Cache'] = state
+    return response
+
+
+def cache_anonymous_page(view):
+    """
+    Serve view from the page cache for anonymous GET requests; see the
+    module docstring. Disabled when PAGE_CACHE_ENABLED is False.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not getattr(settings, 'PAGE_CACHE_ENABLED', True) or not is_cacheable_request(request):
+            return view(request, *args, **kwargs)
+
+        key = page_cache_key(request)
+        version = get_version(PAGES_NAMESPACE)
+        entry = cache.get(key)
+        if entry is not None:
+            age = time.time() - entry['created']
+            if entry['version'] == version and age < getattr(settings, 'PAGE_CACHE_TIMEOUT', 60):
+                return _from_entry(entry, 'hit')
+            # Stale: one request revalidates, the rest keep getting the old copy
+            lock_timeout = getattr(settings, 'PAGE_CACHE_LOCK_TIMEOUT', 30)
+            if not cache.add(f"{key}:revalidating", 1, lock_timeout):
+                return _from_entry(entry, 'stale')
+
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response = response.render()
+            if is_cacheable_response(request, response):
+                _store(key, response, version)
+        finally:
+            if entry is not None:
+                cache.delete(f"{key}:revalidating")
+        response['X-Page-Cache'] = 'miss'
+        return response
+    return wrapper
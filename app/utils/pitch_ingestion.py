@@ -0,0 +1,362 @@
+# pitch_ingestion.py
+"""
+Batch ingestion engine for scraped pitches.
+
+Each batch is resolved with a fixed number of queries regardless of its size:
+existing pitches are prefetched by url, categories by id, taken slugs by
+prefix and replyLink positions from the Mention table; mentions are merged in
+memory with O(1) lookups, and rows are written with bulk_create / bulk_update
+(touched Mention rows are replaced, so replaying a batch is idempotent). Used
+by the add_update_pitch view and the import_pitches management command.
+"""
+import json
+import logging
+from functools import reduce
+from operator import or_
+from urllib.parse import urlparse
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from app.models import Category, Mention, Pitch
+from .listings import invalidate_listings
+from .ranking_system import coerce_pitch_data, full_rank_update, snapshot_rank_inputs, update_rank
+
+logger = logging.getLogger(__name__)
+
+# Fields written by apply_pitch_fields (plus the derived rank fields)
+INGESTED_FIELDS = [
+    'pitch_data', 'meta_data', 'seo_data', 'name', 'title', 'description', 'content', 'tags',
+    'category', 'url', 'icon_url', 'banner_url', 'social_links', 'source', 'slug',
+    'rank', 'total_engagement', 'mention_count', 'updated_at',
+]
+
+
+def new_mentions(item):
+    """Return the mentions carried by an ingested item as a list."""
+    pitch_data = item.get('pitch_data') or []
+    if isinstance(pitch_data, dict):
+        return [pitch_data]
+    return coerce_pitch_data(pitch_data)
+
+
+class MentionIndex(dict):
+    """
+    replyLink -> position of a pitch's mentions. unlinked counts the positions
+    without an entry (no replyLink, or a replyLink repeated later on), so an
+    index that describes mentions has len(index) + unlinked == len(mentions).
+    """
+
+    def __init__(self, *args, unlinked=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.unlinked = unlinked
+
+    def covers(self, mentions):
+        return len(self) + self.unlinked == len(mentions)
+
+
+def _reply_link(mention):
+    return mention.get('replyLink') if isinstance(mention, dict) else None
+
+
+def _scan_index(mentions):
+    index = MentionIndex()
+    for position, mention in enumerate(mentions):
+        reply_link = _reply_link(mention)
+        if not reply_link or reply_link in index:
+            # A later duplicate wins, like Mention.rows_for, leaving the earlier one unlinked
+            index.unlinked += 1
+        if reply_link:
+            index[reply_link] = position
+    return index
+
+
+def _is_at(mentions, position, reply_link):
+    return (position < len(mentions)
+            and isinstance(mentions[position], dict)
+            and mentions[position].get('replyLink') == reply_link)
+
+
+def merge_mentions(existing, incoming, index=None):
+    """
+    Merge incoming mentions into existing ones by replyLink.
+
+    A mention whose replyLink is already present replaces it in place; any
+    other mention, including one without a replyLink, is appended. Returns
+    (merged, touched) where touched lists the positions that were replaced or
+    appended.
+
+    index is a MentionIndex (as persisted in Mention) and is kept up to date in
+    place, so every lookup is O(1). When it is missing or does not cover
+    existing (pitch_data edited elsewhere) it is rebuilt with one scan.
+    """
+    merged = list(existing)
+    if index is None or not index.covers(merged):
+        index = _rebuilt(index, merged)
+    touched = []
+    for mention in incoming:
+        reply_link = _reply_link(mention)
+        if not reply_link:
+            # Nothing to merge on
+            index.unlinked += 1
+            touched.append(len(merged))
+            merged.append(mention)
+            continue
+        position = index.get(reply_link)
+        if position is not None and not _is_at(merged, position, reply_link):
+            index = _rebuilt(index, merged)
+            position = index.get(reply_link)
+        if position is None:
+            position = len(merged)
+            index[reply_link] = position
+            merged.append(mention)
+        else:
+            merged[position] = mention
+        touched.append(position)
+    return merged, touched
+
+
+def _rebuilt(index, mentions):
+    """Replace the contents of index (if given) with a fresh scan of mentions."""
+    fresh = _scan_index(mentions)
+    if index is None:
+        return fresh
+    index.clear()
+    index.update(fresh)
+    index.unlinked = fresh.unlinked
+    return index
+
+
+def linked_count(mentions):
+    """Distinct non-empty replyLinks among mentions: the size of an in-sync mention index."""
+    return len({mention.get('replyLink') for mention in mentions
+                if isinstance(mention, dict) and mention.get('replyLink')})
+
+
+def mention_indexes(pitch_ids):
+    """
+    Load the persisted MentionIndex of several pitches in one query. Mentions
+    without a replyLink have no entry and are counted as unlinked.
+    """
+    indexes = {pitch_id: MentionIndex() for pitch_id in pitch_ids}
+    rows = (Mention.objects
+            .filter(pitch_id__in=pitch_ids)
+            .order_by()
+            .values_list('pitch_id', 'reply_link', 'position'))
+    for pitch_id, reply_link, position in rows:
+        if reply_link:
+            indexes[pitch_id][reply_link] = position
+        else:
+            indexes[pitch_id].unlinked += 1
+    return indexes
+
+
+def upsert_mentions(pitch_positions):
+    """
+    Replace the Mention rows for the given (pitch, positions) pairs: rows at
+    those positions or with their replyLinks are deleted in one statement and
+    the fresh ones bulk inserted, so replaying the same mentions is a no-op.
+    (The unique replyLink constraint is partial, which ON CONFLICT can't target.)
+    """
+    rows = []
+    conditions = []
+    for pitch, positions in pitch_positions:
+        pitch_rows = Mention.rows_for(pitch, positions)
+        rows.extend(pitch_rows)
+        links = [row.reply_link for row in pitch_rows if row.reply_link]
+        conditions.append(Q(pitch_id=pitch.pk) & (Q(position__in=list(positions)) | Q(reply_link__in=links)))
+    if rows:
+        Mention.objects.filter(reduce(or_, conditions)).delete()
+        Mention.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def apply_pitch_fields(pitch_obj, item, categories):
+    """
+    Assign the seo_data / meta_data / pitch_data of an ingested item to a
+    pitch. categories maps category id -> Category for the whole batch.
+    """
+    pitch_obj.pitch_data = item.get('pitch_data', [])
+    pitch_obj.meta_data = item.get('meta_data', {})
+    pitch_obj.seo_data = item.get('seo_data', {})
+
+    # Process SEO data
+    seo = item.get('seo_data', {})
+    if seo:
+        pitch_obj.name = seo.get('name') or seo.get('seo_title') or 'Untitled'
+        pitch_obj.title = seo.get('seo_title', '')
+        pitch_obj.description = seo.get('seo_description', '')
+        pitch_obj.content = seo.get('seo_content', '')
+        pitch_obj.tags = json.dumps(seo.get('tags', []))
+
+        # Handle category
+        category_id = seo.get('category_id')
+        if category_id:
+            category = categories.get(_category_key(category_id))
+            if category:
+                pitch_obj.category = category
+            else:
+                logger.warning("Category with id %s not found", category_id)
+
+    # Process meta data
+    meta = item.get('meta_data', {})
+    if meta:
+        pitch_obj.url = meta.get('final_url', '')
+        pitch_obj.icon_url = meta.get('icon_url', '')
+        pitch_obj.banner_url = meta.get('banner_url', '')
+
+        # Handle social links
+        social_links = meta.get('social_links', {})
+        pitch_obj.social_links = json.dumps(social_links)
+
+    mentions = coerce_pitch_data(pitch_obj.pitch_data)
+    if mentions and isinstance(mentions[-1], dict):
+        pitch_obj.source = mentions[-1].get('replyLink', '')
+
+
+def _category_key(category_id):
+    try:
+        return int(category_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _taken_slugs(bases):
+    """Fetch every existing slug equal to, or suffixed from, one of bases in one query."""
+    if not bases:
+        return set()
+    condition = reduce(or_, (Q(slug=base) | Q(slug__startswith=f"{base}-") for base in bases))
+    return set(Pitch.objects.filter(condition).values_list('slug', flat=True))
+
+
+def _assign_slugs(pitches):
+    """Give every pitch without a slug a unique one, mirroring Pitch.save()."""
+    needing = [pitch for pitch in pitches if not pitch.slug and pitch.name]
+    bases = {slugify(pitch.name) for pitch in needing}
+    taken = _taken_slugs(bases)
+    for pitch in needing:
+        original_slug = slugify(pitch.name)
+        slug = original_slug
+        num = 1
+        while slug in taken:
+            slug = f"{original_slug}-{num}"
+            num += 1
+        pitch.slug = slug
+        taken.add(slug)
+
+
+def ingest_batch(items, user=None):
+    """
+    Create or update the pitches described by items in a single transaction.
+
+    Returns:
+        tuple: (created_pitches, updated_pitches, skipped_count)
+    """
+    urls = set()
+    category_ids = set()
+    for item in items:
+        url = (item.get('meta_data') or {}).get('final_url')
+        if url:
+            urls.add(url)
+        category_key = _category_key((item.get('seo_data') or {}).get('category_id'))
+        if category_key is not None:
+            category_ids.add(category_key)
+
+    # One query each for existing pitches and referenced categories
+    existing = {}
+    for pitch in Pitch.objects.filter(url__in=urls).order_by('-rank', '-created_at'):
+        existing.setdefault(pitch.url, pitch)
+    categories = Category.objects.in_bulk(category_ids)
+
+    indexes = mention_indexes([pitch.pk for pitch in existing.values()])
+
+    by_url = dict(existing)
+    created = []
+    updated = {}
+    touched = {}
+    resync = set()
+    skipped = 0
+    for item in items:
+        url = (item.get('meta_data') or {}).get('final_url')
+        if not url:
+            logger.warning("Skipping pitch: No URL found")
+            skipped += 1
+            continue
+
+        pitch = by_url.get(url)
+        if pitch is not None and pitch.pk is not None:
+            # Merge the new mentions with the ones already stored
+            existing_mentions = coerce_pitch_data(pitch.pitch_data)
+            stored_index = indexes.get(pitch.pk)
+            if pitch.pk not in updated and len(stored_index) != linked_count(existing_mentions):
+                # Mention rows missing or out of date: mirror every mention, not just the new ones
+                resync.add(pitch.pk)
+            merged, positions = merge_mentions(existing_mentions, new_mentions(item), stored_index)
+            apply_pitch_fields(pitch, dict(item, pitch_data=merged), categories)
+            updated[pitch.pk] = pitch
+            touched.setdefault(pitch.pk, set()).update(positions)
+        elif pitch is not None:
+            # Same URL twice in one batch, not yet created
+            merged, positions = merge_mentions(coerce_pitch_data(pitch.pitch_data), new_mentions(item))
+            apply_pitch_fields(pitch, dict(item, pitch_data=merged), categories)
+        else:
+            pitch = Pitch(user=user)
+            apply_pitch_fields(pitch, dict(item, pitch_data=new_mentions(item)), categories)
+            if not pitch.name:
+                pitch.name = f"Pitch from {urlparse(url).netloc}"
+            by_url[url] = pitch
+            created.append(pitch)
+
+    _assign_slugs(created + list(updated.values()))
+    now = timezone.now()
+    for pitch in created:
+        full_rank_update(pitch)
+    for pitch in updated.values():
+        update_rank(pitch, getattr(pitch, '_rank_snapshot', None))
+        pitch.updated_at = now
+
+    with transaction.atomic():
+        if created:
+            Pitch.objects.bulk_create(created)
+        if updated:
+            Pitch.objects.bulk_update(list(updated.values()), INGESTED_FIELDS)
+        Mention.rebuild_for(created + [updated[pk] for pk in resync])
+        upsert_mentions([(pitch, touched[pk]) for pk, pitch in updated.items() if pk not in resync])
+        # bulk writes bypass post_save
+        invalidate_listings()
+
+    for pitch in created + list(updated.values()):
+        pitch._rank_snapshot = snapshot_rank_inputs(pitch)
+    return created, list(updated.values()), skipped
+
+
+def ingest_pitches(items, user=None, batch_size=200, progress=None):
+    """
+    Ingest an iterable of pitch items in chunks of batch_size, each chunk in
+    its own transaction, so large imports never hold one giant transaction.
+    progress, if given, is called with the running result after each chunk.
+
+    Returns:
+        dict: 'created' and 'updated' pitch lists and the 'skipped' count.
+    """
+    result = {'created': [], 'updated': [], 'skipped': 0}
+    batch = []
+
+    def flush():
+        created, updated, skipped = ingest_batch(batch, user=user)
+        result['created'].extend(created)
+        result['updated'].extend(updated)
+        result['skipped'] += skipped
+        batch.clear()
+        if progress is not None:
+            progress(result)
+
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return result
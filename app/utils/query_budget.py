@@ -0,0 +1,121 @@
+# query_budget.py
+"""
+SQL query recording and budgets.
+
+QueryRecorder hooks connection.execute_wrapper, so it sees every query a
+block of code runs (DEBUG does not need to be on). Queries are grouped by
+normalized SQL, with literals and IN lists collapsed, so an N+1 loop shows up
+as one statement repeated N times. Used by QueryBudgetMiddleware, by the
+check_query_budgets management command and, through query_budget(), by
+anything that wants to fail when a block runs more queries than it should.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def normalize_sql(sql):
+    """Collapse literals, IN lists and whitespace so repeated statements compare equal."""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """
+    Context manager recording every query run on a database connection.
+
+    Usage:
+        with QueryRecorder() as recorder:
+            ...
+        recorder.count, recorder.duplicates()
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.connection = connections[using]
+        self.queries = []
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({'sql': sql, 'time': time.perf_counter() - start})
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+        self._wrapper = None
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(query['time'] for query in self.queries)
+
+    def duplicates(self):
+        """Return {normalized_sql: count} for every statement run more than once."""
+        counts = Counter(normalize_sql(query['sql']) for query in self.queries)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+    def report(self, label=''):
+        """Human-readable summary listing the most repeated statements first."""
+        lines = [f"{label or 'block'}: {self.count} queries in {self.total_time * 1000:.1f}ms"]
+        for sql, count in sorted(self.duplicates().items(), key=lambda item: -item[1]):
+            lines.append(f"  {count}x {sql[:200]}")
+        return "\n".join(lines)
+
+
+def check_budget(recorder, max_queries=None, max_duplicates=None, label=''):
+    """
+    Return a list of budget violations for a finished recording (empty when
+    it is within budget). None disables a limit.
+    """
+    problems = []
+    if max_queries is not None and recorder.count > max_queries:
+        problems.append(f"{recorder.count} queries (budget {max_queries})")
+    if max_duplicates is not None:
+        for sql, count in recorder.duplicates().items():
+            if count > max_duplicates:
+                problems.append(f"{count}x repeated (budget {max_duplicates}): {sql[:200]}")
+    return problems
+
+
+@contextmanager
+def query_budget(max_queries=None, max_duplicates=None, label='', using=DEFAULT_DB_ALIAS):
+    """
+    Fail with QueryBudgetExceeded if the block runs more than max_queries
+    queries or repeats one normalized statement more than max_duplicates
+    times.
+
+    Usage:
+        with query_budget(max_queries=6, max_duplicates=1, label='categories'):
+            client.get('/categories/')
+    """
+    with QueryRecorder(using=using) as recorder:
+        yield recorder
+    problems = check_budget(recorder, max_queries, max_duplicates, label)
+    if problems:
+        raise QueryBudgetExceeded(f"{label or 'block'} over query budget: " + "; ".join(problems)
+                                  + "\n" + recorder.report(label))
@@ -1,3 +1,23 @@
+import copy
+import json
+import math
+from datetime import datetime, timezone
+
+from django.db.models import Case, FloatField, IntegerField, Value, When
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce, Round
+
+
+# Weights used by calculate_rank (and the vectorized bulk path in
+# vectorized_ranking.py). Change them here and run `manage.py rank_pitches`.
+REPLY_WEIGHT = 4
+RETWEET_WEIGHT = 2.5
+LIKE_WEIGHT = 1.5
+VIEWS_DIVISOR = 800
+CLAP_WEIGHT = 3
+CLAIMED_BOOST = 1.5
+
+
 def calculate_rank(engagement_data, claps=0, claimed=False):
     """
     Calculate the ranking score for a pitch.
@@ -28,10 +48,351 @@ def calculate_rank(engagement_data, claps=0, claimed=False):
     views = engagement_data.get('views', 0)
     
     # Calculate base score using weighted metrics.
-    base_score = (replies * 4) + (retweets * 2.5) + (likes * 1.5) + (views / 800) + (claps * 3)
+    base_score = ((replies * REPLY_WEIGHT) + (retweets * RETWEET_WEIGHT) + (likes * LIKE_WEIGHT)
+                  + (views / VIEWS_DIVISOR) + (claps * CLAP_WEIGHT))
     
     # Claimed pitches get a 50% boost.
-    boost_factor = 1.5 if claimed else 1.0
+    boost_factor = CLAIMED_BOOST if claimed else 1.0
     final_score = base_score * boost_factor
 
     return round(final_score)
+
+
+def rank_expression(claps):
+    """
+    SQL expression equivalent to calculate_rank over a pitch's stored
+    total_engagement and claimed fields.
+
+    Lets a single UPDATE change clap and rank together, e.g.
+    update(clap=F('clap') + 1, rank=rank_expression(F('clap') + 1)).
+    The database's ROUND may break exact .5 ties differently from round();
+    the next full recompute settles any such row.
+
+    Parameters:
+        claps: Expression (or int) for the new effective clap count.
+    """
+    def metric(key):
+        return Coalesce(Cast(KT(f'total_engagement__{key}'), FloatField()), Value(0.0))
+
+    base_score = ((metric('replies') * REPLY_WEIGHT) + (metric('retweets') * RETWEET_WEIGHT)
+                  + (metric('likes') * LIKE_WEIGHT) + (metric('views') / VIEWS_DIVISOR)
+                  + (claps * CLAP_WEIGHT))
+    boost_factor = Case(
+        When(claimed=True, then=Value(CLAIMED_BOOST)),
+        default=Value(1.0),
+        output_field=FloatField(),
+    )
+    return Cast(Round(base_score * boost_factor), IntegerField())
+
+
+ENGAGEMENT_KEYS = ('replies', 'retweets', 'likes', 'views')
+
+# Fields that feed calculate_rank and the fields derived from them.
+RANK_INPUT_FIELDS = ('pitch_data', 'clap', 'claimed')
+RANK_OUTPUT_FIELDS = ('rank', 'total_engagement', 'mention_count')
+
+# Marker for fields that were deferred when the pitch was loaded.
+_DEFERRED = object()
+
+
+def empty_engagement():
+    """Return a zeroed engagement dict."""
+    return {key: 0 for key in ENGAGEMENT_KEYS}
+
+
+def coerce_pitch_data(pitch_data):
+    """
+    Return pitch_data as a list of mentions.
+
+    Older rows store pitch_data as a JSON string; anything that is not a list
+    (or a string decoding to one) is treated as having no mentions.
+    """
+    if isinstance(pitch_data, str):
+        try:
+            pitch_data = json.loads(pitch_data)
+        except json.JSONDecodeError:
+            return []
+    return pitch_data if isinstance(pitch_data, list) else []
+
+
+def mention_engagement(mention):
+    """Return the engagement counters of a single pitch_data entry."""
+    if not isinstance(mention, dict):
+        return empty_engagement()
+    engagement = mention.get('engagement') or {}
+    return {key: engagement.get(key, 0) for key in ENGAGEMENT_KEYS}
+
+
+def sum_engagement(pitch_data):
+    """Total the engagement counters over every mention in pitch_data."""
+    total = empty_engagement()
+    for mention in coerce_pitch_data(pitch_data):
+        for key, value in mention_engagement(mention).items():
+            total[key] += value
+    return total
+
+
+def engagement_delta(old_mentions, new_mentions):
+    """
+    Return the engagement difference between two versions of pitch_data, or
+    None when no mention changed.
+
+    Mentions are compared by value, position by position, so a mention
+    edited in place counts as changed as long as old_mentions is a copy (see
+    snapshot_rank_inputs).
+    """
+    delta = empty_engagement()
+    changed = False
+    for index in range(max(len(old_mentions), len(new_mentions))):
+        old = old_mentions[index] if index < len(old_mentions) else None
+        new = new_mentions[index] if index < len(new_mentions) else None
+        if old == new:
+            continue
+        changed = True
+        for key, value in mention_engagement(new).items():
+            delta[key] += value
+        for key, value in mention_engagement(old).items():
+            delta[key] -= value
+    return delta if changed else None
+
+
+def snapshot_rank_inputs(pitch):
+    """
+    Capture the rank inputs of a pitch as loaded from the database.
+
+    pitch_data is deep-copied so later saves can tell which mentions were
+    added, removed or changed, including mentions edited in place. Deferred
+    fields are recorded as such and never trigger a query.
+    """
+    loaded = pitch.__dict__
+    snapshot = {}
+    for field in RANK_INPUT_FIELDS:
+        if field not in loaded:
+            snapshot[field] = _DEFERRED
+        elif field == 'pitch_data':
+            snapshot[field] = copy.deepcopy(coerce_pitch_data(loaded[field]))
+        else:
+            snapshot[field] = loaded[field]
+    return snapshot
+
+
+def pitch_data_changed(pitch, snapshot):
+    """Return True if pitch_data differs from the snapshot (or there is no baseline)."""
+    if 'pitch_data' not in pitch.__dict__:
+        return False
+    if snapshot is None or snapshot['pitch_data'] is _DEFERRED:
+        return True
+    old_mentions = snapshot['pitch_data']
+    new_mentions = coerce_pitch_data(pitch.__dict__['pitch_data'])
+    return len(old_mentions) != len(new_mentions) or any(
+        old != new for old, new in zip(old_mentions, new_mentions)
+    )
+
+
+def _apply_rank_fields(pitch, total_engagement, mention_count):
+    """Assign derived rank fields and return the names of those that changed."""
+    rank = calculate_rank(
+        engagement_data=total_engagement,
+        claps=pitch.clap,
+        claimed=pitch.claimed
+    )
+    changed = set()
+    for field, value in (('total_engagement', total_engagement),
+                         ('mention_count', mention_count),
+                         ('rank', rank)):
+        if pitch.__dict__.get(field, _DEFERRED) != value:
+            setattr(pitch, field, value)
+            changed.add(field)
+    return changed
+
+
+def full_rank_update(pitch):
+    """
+    Recompute rank, total_engagement and mention_count from scratch.
+
+    Returns the set of rank fields whose value changed.
+    """
+    mentions = coerce_pitch_data(pitch.pitch_data)
+    return _apply_rank_fields(pitch, sum_engagement(mentions), len(mentions))
+
+
+def update_rank(pitch, snapshot=None):
+    """
+    Bring the derived rank fields of a pitch up to date, doing only the work
+    its changed inputs require.
+
+    - No snapshot (new or unsnapshotted pitch): full recompute.
+    - pitch_data, clap and claimed unchanged: nothing is recomputed.
+    - Only clap/claimed changed: rank is recomputed from the stored
+      total_engagement without walking pitch_data.
+    - pitch_data changed: only the added, replaced or removed mentions are
+      applied to the stored totals as a delta.
+
+    Returns the set of rank fields whose value changed.
+    """
+    if snapshot is None:
+        return full_rank_update(pitch)
+
+    current = pitch.__dict__
+    changed_inputs = set()
+    delta = None
+    for field in RANK_INPUT_FIELDS:
+        if field not in current:
+            # Still deferred, so it cannot have been modified
+            continue
+        if snapshot[field] is _DEFERRED:
+            changed_inputs.add(field)
+        elif field == 'pitch_data':
+            delta = engagement_delta(snapshot[field], coerce_pitch_data(current[field]))
+            if delta is not None:
+                changed_inputs.add(field)
+        elif snapshot[field] != current[field]:
+            changed_inputs.add(field)
+
+    if not changed_inputs:
+        return set()
+
+    stored_total = current.get('total_engagement')
+    has_stored_total = (
+        isinstance(stored_total, dict)
+        and all(key in stored_total for key in ENGAGEMENT_KEYS)
+        and 'mention_count' in current
+    )
+
+    if 'pitch_data' not in changed_inputs:
+        if not has_stored_total:
+            return full_rank_update(pitch)
+        return _apply_rank_fields(pitch, dict(stored_total), current['mention_count'])
+
+    if delta is None or not has_stored_total:
+        return full_rank_update(pitch)
+
+    total_engagement = {key: stored_total[key] + delta[key] for key in ENGAGEMENT_KEYS}
+    return _apply_rank_fields(pitch, total_engagement, len(coerce_pitch_data(current['pitch_data'])))
+
+
+def _invalidate_listings():
+    # listings imports app.models, which imports this module
+    from .listings import invalidate_listings
+    invalidate_listings()
+
+
+def recompute_ranks(queryset, batch_size=500):
+    """
+    Fully recompute the rank fields of every pitch in a queryset and write the
+    rows that changed with bulk_update, batch_size rows at a time.
+
+    Unlike Pitch.save() this skips slug generation and per-row UPDATEs, which
+    makes it the path for admin actions and post-ingestion rebuilds.
+
+    Returns:
+        int: The number of pitches whose rank fields were updated.
+    """
+    model = queryset.model
+    fields = list(RANK_OUTPUT_FIELDS)
+    rows = (queryset
+            .select_related(None)
+            .only('id', *RANK_INPUT_FIELDS, *RANK_OUTPUT_FIELDS)
+            .iterator(chunk_size=batch_size))
+
+    updated = 0
+    pending = []
+    for pitch in rows:
+        if full_rank_update(pitch):
+            pending.append(pitch)
+        if len(pending) >= batch_size:
+            model.objects.bulk_update(pending, fields)
+            updated += len(pending)
+            pending = []
+    if pending:
+        model.objects.bulk_update(pending, fields)
+        updated += len(pending)
+    if updated:
+        _invalidate_listings()
+    return updated
+
+
+def parse_mention_datetime(mention):
+    """Return the aware datetime of a mention's timestamp, or None if missing/invalid."""
+    if not isinstance(mention, dict):
+        return None
+    value = (mention.get('timestamp') or {}).get('datetime')
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def calculate_trending_score(pitch_data, now, half_life_hours, claimed=False):
+    """
+    Calculate a time-decayed ranking score for a pitch.
+
+    Each mention contributes its weighted engagement (the calculate_rank
+    weights, without claps) multiplied by
+
+        0.5 ** (age_in_hours / half_life_hours)
+
+    so a mention is worth half as much every half_life_hours. Mentions without
+    a usable timestamp.datetime contribute nothing. Claimed pitches get the
+    same boost as in calculate_rank.
+
+    Parameters:
+        pitch_data (list): The pitch's social media mentions.
+        now (datetime): Aware reference time for the decay.
+        half_life_hours (float): Hours after which a mention's weight halves.
+        claimed (bool): True if the pitch is claimed by a verified founder.
+
+    Returns:
+        float: The trending score.
+    """
+    score = 0.0
+    for mention in coerce_pitch_data(pitch_data):
+        mentioned_at = parse_mention_datetime(mention)
+        if mentioned_at is None:
+            continue
+        engagement = mention_engagement(mention)
+        weighted = ((engagement['replies'] * REPLY_WEIGHT) + (engagement['retweets'] * RETWEET_WEIGHT)
+                    + (engagement['likes'] * LIKE_WEIGHT) + (engagement['views'] / VIEWS_DIVISOR))
+        age_hours = max(0.0, (now - mentioned_at).total_seconds() / 3600)
+        score += weighted * math.pow(0.5, age_hours / half_life_hours)
+
+    boost_factor = CLAIMED_BOOST if claimed else 1.0
+    return round(score * boost_factor, 4)
+
+
+def refresh_trending_scores(queryset, now, half_life_hours, batch_size=500):
+    """
+    Recompute trending_score for every pitch in a queryset and bulk-write the
+    rows that changed. Meant to run from a periodic job, never per request.
+
+    Returns:
+        int: The number of pitches whose trending score was updated.
+    """
+    model = queryset.model
+    rows = (queryset
+            .select_related(None)
+            .only('id', 'pitch_data', 'claimed', 'trending_score')
+            .iterator(chunk_size=batch_size))
+
+    updated = 0
+    pending = []
+    for pitch in rows:
+        score = calculate_trending_score(pitch.pitch_data, now, half_life_hours, claimed=pitch.claimed)
+        if score != pitch.trending_score:
+            pitch.trending_score = score
+            pending.append(pitch)
+        if len(pending) >= batch_size:
+            model.objects.bulk_update(pending, ['trending_score'])
+            updated += len(pending)
+            pending = []
+    if pending:
+        model.objects.bulk_update(pending, ['trending_score'])
+        updated += len(pending)
+    if updated:
+        _invalidate_listings()
+    return updated
@@ -0,0 +1,215 @@
+# related_graph.py
+"""
+Precomputed related-pitches graph.
+
+Every pitch gets its top-K neighbours scored by shared category, overlapping
+tags and shared mention handles, stored as RelatedPitch rows in order, so the
+detail page reads its neighbour ids instead of computing them per view.
+
+Candidates come from inverted indexes (category -> pitches by rank,
+tag -> pitches, handle -> pitches), so scoring a pitch only touches pitches
+it has something in common with. Very common tags are skipped (they say
+little about relatedness and would make every pitch a candidate), and only
+the best ranked members of a category are considered. Pitches with fewer
+than K candidates are padded with the top ranked pitches overall.
+
+rebuild_related_pitches() recomputes the whole graph from one pass over the
+table; refresh_related_pitches() recomputes the lists of a few pitches from
+targeted queries (indexed, except for a LIKE scan over Pitch.tags). Both
+are run by the rebuild_related_pitches command.
+"""
+import json
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+
+from app.models import Mention, Pitch, RelatedPitch
+from .cache_versions import bump_version
+
+RELATED_NAMESPACE = 'related-graph'
+
+TOP_K = 10
+CATEGORY_WEIGHT = 3.0
+TAG_WEIGHT = 2.0
+HANDLE_WEIGHT = 4.0
+CATEGORY_CANDIDATES = 200   # best ranked members of a category considered per pitch
+MAX_TAG_FANOUT = 500        # tags shared by more pitches than this are ignored
+
+
+def parse_tags(tags):
+    """Pitch.tags is a JSON-encoded list; return its entries as a lowercased set."""
+    if isinstance(tags, str):
+        try:
+            tags = json.loads(tags)
+        except json.JSONDecodeError:
+            return set()
+    if not isinstance(tags, list):
+        return set()
+    return {str(tag).strip().lower() for tag in tags if str(tag).strip()}
+
+
+class GraphFeatures:
+    """Per-pitch features and the inverted indexes built from them."""
+
+    def __init__(self, pitch_rows, handle_rows):
+        """
+        pitch_rows: (id, category_id, tags, rank) tuples
+        handle_rows: (pitch_id, handle_lower) tuples
+        """
+        self.category = {}
+        self.tags = {}
+        self.rank = {}
+        self.by_category = defaultdict(list)
+        self.by_tag = defaultdict(set)
+        for pitch_id, category_id, tags, rank in pitch_rows:
+            self.category[pitch_id] = category_id
+            self.tags[pitch_id] = parse_tags(tags)
+            self.rank[pitch_id] = rank or 0
+            if category_id is not None:
+                self.by_category[category_id].append(pitch_id)
+            for tag in self.tags[pitch_id]:
+                self.by_tag[tag].add(pitch_id)
+        for members in self.by_category.values():
+            members.sort(key=lambda pitch_id: (-self.rank[pitch_id], -pitch_id))
+
+        self.handles = defaultdict(set)
+        self.by_handle = defaultdict(set)
+        for pitch_id, handle in handle_rows:
+            if handle and pitch_id in self.rank:
+                self.handles[pitch_id].add(handle)
+                self.by_handle[handle].add(pitch_id)
+
+        self.top_ranked = sorted(self.rank, key=lambda pitch_id: (-self.rank[pitch_id], -pitch_id))
+
+    def neighbours(self, pitch_id, k=TOP_K):
+        """Return the k best (related_id, score) pairs for pitch_id."""
+        scores = defaultdict(float)
+        category_id = self.category.get(pitch_id)
+        if category_id is not None:
+            for other in self.by_category[category_id][:CATEGORY_CANDIDATES]:
+                scores[other] += CATEGORY_WEIGHT
+        for tag in self.tags.get(pitch_id, ()):
+            members = self.by_tag[tag]
+            if len(members) <= MAX_TAG_FANOUT:
+                for other in members:
+                    scores[other] += TAG_WEIGHT
+        for handle in self.handles.get(pitch_id, ()):
+            for other in self.by_handle[handle]:
+                scores[other] += HANDLE_WEIGHT
+        scores.pop(pitch_id, None)
+
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (-item[1], -self.rank.get(item[0], 0), -item[0]),
+        )[:k]
+        if len(ranked) < k:
+            chosen = {related_id for related_id, _ in ranked} | {pitch_id}
+            for other in self.top_ranked:
+                if len(ranked) >= k:
+                    break
+                if other not in chosen:
+                    ranked.append((other, 0.0))
+        return ranked
+
+
+def _write_edges(neighbours_by_pitch):
+    """Replace the RelatedPitch rows of the given pitches in one transaction."""
+    rows = [
+        RelatedPitch(pitch_id=pitch_id, related_id=related_id, position=position, score=score)
+        for pitch_id, neighbours in neighbours_by_pitch.items()
+        for position, (related_id, score) in enumerate(neighbours)
+    ]
+    with transaction.atomic():
+        RelatedPitch.objects.filter(pitch_id__in=list(neighbours_by_pitch)).delete()
+        RelatedPitch.objects.bulk_create(rows, batch_size=1000)
+        bump_version(RELATED_NAMESPACE)
+    return len(rows)
+
+
+def rebuild_related_pitches(k=TOP_K, batch_size=1000):
+    """
+    Recompute the neighbours of every pitch from one pass over Pitch and
+    Mention, writing batch_size pitches per transaction.
+
+    Returns:
+        int: The number of pitches processed.
+    """
+    features = GraphFeatures(
+        Pitch.objects.order_by().values_list('id', 'category_id', 'tags', 'rank').iterator(chunk_size=5000),
+        Mention.objects.order_by().values_list('pitch_id', 'handle_lower').distinct().iterator(chunk_size=5000),
+    )
+    pitch_ids = sorted(features.rank)
+    for start in range(0, len(pitch_ids), batch_size):
+        _write_edges({
+            pitch_id: features.neighbours(pitch_id, k)
+            for pitch_id in pitch_ids[start:start + batch_size]
+        })
+    return len(pitch_ids)
+
+
+def _candidate_ids(pitch_row, handles, k):
+    """
+    Ids of every pitch that could score against pitch_row. The rank, category
+    and handle lookups use indexes; Pitch.tags is a JSON string, so the tag
+    lookup is a LIKE scan over the table (one OR-ed query for all tags).
+    """
+    pitch_id, category_id, tags, _ = pitch_row
+    candidates = set(Pitch.objects.order_by('-rank', '-id').values_list('id', flat=True)[:k + 1])
+    if category_id is not None:
+        candidates.update(Pitch.objects
+                          .filter(category_id=category_id)
+                          .order_by('-rank', '-id')
+                          .values_list('id', flat=True)[:CATEGORY_CANDIDATES])
+    tag_set = parse_tags(tags)
+    if tag_set:
+        condition = reduce(or_, (Q(tags__icontains=json.dumps(tag)) for tag in tag_set))
+        candidates.update(Pitch.objects.filter(condition).values_list('id', flat=True)[:MAX_TAG_FANOUT * len(tag_set)])
+    if handles:
+        candidates.update(Mention.objects
+                          .filter(handle_lower__in=handles)
+                          .values_list('pitch_id', flat=True)
+                          .distinct())
+    candidates.add(pitch_id)
+    return candidates
+
+
+def refresh_related_pitches(pitch_ids, k=TOP_K):
+    """
+    Recompute the neighbours of the given pitches only, loading just their
+    candidates. Lists of other pitches that should now include them are
+    updated by the next full rebuild.
+
+    Returns:
+        int: The number of pitches refreshed.
+    """
+    neighbours_by_pitch = {}
+    rows = Pitch.objects.filter(id__in=pitch_ids).values_list('id', 'category_id', 'tags', 'rank')
+    for pitch_row in rows:
+        pitch_id = pitch_row[0]
+        handles = set(Mention.objects
+                      .filter(pitch_id=pitch_id)
+                      .exclude(handle_lower='')
+                      .values_list('handle_lower', flat=True))
+        candidates = _candidate_ids(pitch_row, handles, k)
+        features = GraphFeatures(
+            Pitch.objects.filter(id__in=candidates).values_list('id', 'category_id', 'tags', 'rank'),
+            Mention.objects
+            .filter(pitch_id__in=candidates, handle_lower__in=handles)
+            .values_list('pitch_id', 'handle_lower')
+            .distinct(),
+        )
+        neighbours_by_pitch[pitch_id] = features.neighbours(pitch_id, k)
+    if neighbours_by_pitch:
+        _write_edges(neighbours_by_pitch)
+    return len(neighbours_by_pitch)
+
+
+def stored_related_ids(pitch):
+    """The precomputed neighbour ids of pitch, best first (empty if not built yet)."""
+    return list(RelatedPitch.objects
+                .filter(pitch=pitch)
+                .order_by('position')
+                .values_list('related_id', flat=True))
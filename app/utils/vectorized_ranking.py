@@ -0,0 +1,138 @@
+# vectorized_ranking.py
+"""
+Bulk ranking over the whole Pitch table.
+
+The rank inputs of every pitch are loaded into columnar NumPy arrays, the
+calculate_rank formula is applied as a single vectorized expression and only
+the ranks that changed are written back, in chunked bulk_update batches.
+"""
+import time
+
+import numpy as np
+from django.db import transaction
+
+from app.models import Pitch
+from .listings import invalidate_listings
+from .ranking_system import (
+    CLAIMED_BOOST, CLAP_WEIGHT, ENGAGEMENT_KEYS, LIKE_WEIGHT, REPLY_WEIGHT, RETWEET_WEIGHT,
+    VIEWS_DIVISOR,
+)
+
+
+def _engagement_value(total_engagement, key):
+    if not isinstance(total_engagement, dict):
+        return 0
+    return total_engagement.get(key, 0) or 0
+
+
+def load_rank_columns(queryset=None):
+    """
+    Load id, engagement totals, clap, claimed and rank for every pitch into
+    NumPy arrays keyed by column name.
+
+    Engagement comes from the stored total_engagement field, which Pitch.save()
+    keeps in sync with pitch_data, so no mention JSON is walked here.
+    """
+    if queryset is None:
+        queryset = Pitch.objects.all()
+    rows = list(queryset.order_by().values_list('id', 'total_engagement', 'clap', 'claimed', 'rank'))
+    count = len(rows)
+
+    columns = {
+        'id': np.fromiter((row[0] for row in rows), dtype=np.int64, count=count),
+        'clap': np.fromiter((row[2] or 0 for row in rows), dtype=np.float64, count=count),
+        'claimed': np.fromiter((bool(row[3]) for row in rows), dtype=bool, count=count),
+        'rank': np.fromiter((row[4] or 0 for row in rows), dtype=np.int64, count=count),
+    }
+    for key in ENGAGEMENT_KEYS:
+        columns[key] = np.fromiter(
+            (_engagement_value(row[1], key) for row in rows), dtype=np.float64, count=count
+        )
+    return columns
+
+
+def vectorized_ranks(replies, retweets, likes, views, claps, claimed):
+    """
+    Apply the calculate_rank formula to whole columns at once.
+
+    The operations run in the same order as calculate_rank and np.rint rounds
+    half to even like round(), so every element matches the per-row result.
+
+    Returns:
+        numpy.ndarray: int64 rank for each row.
+    """
+    base_score = ((replies * REPLY_WEIGHT) + (retweets * RETWEET_WEIGHT) + (likes * LIKE_WEIGHT)
+                  + (views / VIEWS_DIVISOR) + (claps * CLAP_WEIGHT))
+    boost_factor = np.where(claimed, CLAIMED_BOOST, 1.0)
+    return np.rint(base_score * boost_factor).astype(np.int64)
+
+
+def bulk_rank_pitches(queryset=None, batch_size=1000):
+    """
+    Recompute the rank of every pitch in queryset (default: all pitches) and
+    write back the ones that changed.
+
+    Returns:
+        int: The number of pitches whose rank changed.
+    """
+    columns = load_rank_columns(queryset)
+    ranks = vectorized_ranks(
+        columns['replies'], columns['retweets'], columns['likes'], columns['views'],
+        columns['clap'], columns['claimed'],
+    )
+    changed = np.flatnonzero(ranks != columns['rank'])
+    ids = columns['id'][changed].tolist()
+    new_ranks = ranks[changed].tolist()
+
+    with transaction.atomic():
+        for start in range(0, len(ids), batch_size):
+            batch = [
+                Pitch(id=pitch_id, rank=rank)
+                for pitch_id, rank in zip(ids[start:start + batch_size], new_ranks[start:start + batch_size])
+            ]
+            Pitch.objects.bulk_update(batch, ['rank'])
+        invalidate_listings()
+    return len(ids)
+
+
+def benchmark_rank_paths(queryset=None, batch_size=1000):
+    """
+    Time the per-row save() path against bulk_rank_pitches on the same rows.
+
+    Both paths run inside a transaction that is rolled back, so the database is
+    left untouched. The per-row ranks are compared with the vectorized ones to
+    confirm they agree.
+
+    Returns:
+        dict: Row count, seconds for each path and the number of mismatches.
+    """
+    if queryset is None:
+        queryset = Pitch.objects.all()
+
+    with transaction.atomic():
+        start = time.perf_counter()
+        per_row_ranks = {}
+        for pitch in queryset.iterator():
+            pitch.rank_setter()
+            pitch.save()
+            per_row_ranks[pitch.id] = pitch.rank
+        per_row_seconds = time.perf_counter() - start
+        transaction.set_rollback(True)
+
+    with transaction.atomic():
+        start = time.perf_counter()
+        bulk_rank_pitches(queryset, batch_size=batch_size)
+        vectorized_seconds = time.perf_counter() - start
+        vectorized_ranks_by_id = dict(queryset.order_by().values_list('id', 'rank'))
+        transaction.set_rollback(True)
+
+    mismatches = sum(
+        1 for pitch_id, rank in per_row_ranks.items()
+        if vectorized_ranks_by_id.get(pitch_id) != rank
+    )
+    return {
+        'rows': len(per_row_ranks),
+        'per_row_seconds': per_row_seconds,
+        'vectorized_seconds': vectorized_seconds,
+        'mismatches': mismatches,
+    }
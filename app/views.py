@@ -16,17 +16,24 @@ from django.db.models import F
 from django.views.decorators.csrf import csrf_exempt
 
 from .models import *
-from django.core.paginator import Paginator
+from .utils.clap_buffer import clap_buffer
+from .utils.cursor_pagination import (
+    CREATED_ORDERING, RANK_ORDERING, TRENDING_ORDERING, InvalidCursor, cursor_paginate,
+)
+from .utils.detail_bundle import get_detail_bundle, related_pitches
+from .utils.json_response import FastJsonResponse
+from .utils.listings import cached_top_pitches_by_category, feed_values
+from .utils.page_cache import cache_anonymous_page
 from django_user_agents.utils import get_user_agent
 
 
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.utils.html import escape
 
 # Main Page Views
 
 
 
+@cache_anonymous_page
 def index(request):
     # Get user agent information
     current_page = 'index'
@@ -37,8 +44,10 @@ def index(request):
         'id', 'name', 'title', 'description', 'slug', 
         'icon_url', 'banner_url', 'url', 'source',
         'category_id',  # Changed from 'category' to 'category_id'
-        'rank', 'clap', 'created_at',
-        'is_featured', 'is_launched'
+        'rank', 'clap', 'raw_clap_total', 'created_at',
+        'is_featured', 'is_launched',
+        # Read by main-content / right-sidebar / mobile-leaderboard; deferring them costs a query per row
+        'pitch_data', 'mention_count', 'claimed',
     ]
     
     # If you need category fields in your template, include them explicitly
@@ -58,15 +67,11 @@ def index(request):
                   .only(*(common_fields + category_fields))
                   .order_by('-rank')[:10])
     
-    # Get new pitches (recently added)
-    new_pitches = (Pitch.objects
-                  .select_related('category')
-                  .only(*(common_fields + category_fields))
-                  .order_by('-created_at')[:16])
-    
-    paginator = Paginator(new_pitches, 16)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Get new pitches (recently added); infinite scroll continues from next_cursor
+    page_obj = cursor_paginate(Pitch.objects
+                               .select_related('category')
+                               .only(*(common_fields + category_fields)),
+                               CREATED_ORDERING, per_page=16)
     
     # Get distinct categories with at least one pitch
     categories = (Category.objects
@@ -84,6 +89,7 @@ def index(request):
         'top_pitches': top_pitches,
         'new_pitches': page_obj,
         'pitches': page_obj,
+        'next_cursor': page_obj.next_cursor,
         'categories': categories,
         'current_page': current_page,
             }
@@ -100,78 +106,66 @@ def pitches(request):
     # Get query parameters
     action = request.GET.get('action', '')
     
-    # Fix: Convert page to integer with proper error handling
-    try:
-        page = int(request.GET.get('page', 1))
-    except (ValueError, TypeError):
-        page = 1
-    
     # Base queryset
     pitches_qs = Pitch.objects.all().order_by('-created_at')
     
-    # Pagination
-    paginator = Paginator(pitches_qs, 20)
-    try:
-        page_obj = paginator.page(page)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
-    
     # Check if it's an AJAX request or explicitly requesting JSON
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.GET.get('format') == 'json':
-        # Serialize the pitches
+        # Keyset pagination on (created_at, id): no COUNT(*), no OFFSET scan
+        try:
+            page_obj = cursor_paginate(feed_values(pitches_qs), CREATED_ORDERING,
+                                       cursor=request.GET.get('cursor'), per_page=20)
+        except InvalidCursor:
+            return FastJsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+        
+        # Serialize the projected rows; only the first mention was loaded
         pitches_list = []
-        for pitch in page_obj:
-            pitch_data = {
-                'id': pitch.id,
-                'slug': pitch.slug,
-                'name': escape(pitch.name),  # Fix: Escape HTML
-                'title': escape(pitch.title),  # Fix: Escape HTML
-                'handle': pitch.pitch_data[0]['user']['handle'],
-                'description': escape(pitch.description) if pitch.description else None,  # Fix: Escape HTML
-                'banner_url': pitch.banner_url if pitch.banner_url else None,
-                'url': pitch.url,
-                'icon_url': pitch.icon_url if pitch.icon_url else None,
-                'category': pitch.category.name if pitch.category else None,
-                'mention_count': pitch.mention_count,
-                'rank': pitch.rank,
-                'clap': pitch.clap,
-                'created_at': pitch.created_at.isoformat(),
-                'updated_at': pitch.updated_at.isoformat(),
-                'claimed': pitch.claimed,
-            }
-            
-            # Fix: Better handling of pitch_data
-            if hasattr(pitch, 'pitch_data') and pitch.pitch_data:
-                try:
-                    pitch_data['pitch_data'] = pitch.pitch_data[0] if len(pitch.pitch_data) > 0 else None
-                except (IndexError, TypeError):
-                    pitch_data['pitch_data'] = None
-            
-            pitches_list.append(pitch_data)
+        for row in page_obj:
+            first_mention = row['first_mention'] if isinstance(row['first_mention'], dict) else None
+            mention_user = (first_mention or {}).get('user') or {}
+            pitches_list.append({
+                'id': row['id'],
+                'slug': row['slug'],
+                'name': escape(row['name']),  # Fix: Escape HTML
+                'title': escape(row['title']),  # Fix: Escape HTML
+                'handle': mention_user.get('handle') if isinstance(mention_user, dict) else None,
+                'description': escape(row['description']) if row['description'] else None,  # Fix: Escape HTML
+                'banner_url': row['banner_url'] or None,
+                'url': row['url'],
+                'icon_url': row['icon_url'] or None,
+                'category': row['category_name'],
+                'mention_count': row['mention_count'],
+                'rank': row['rank'],
+                'clap': row['clap'],
+                'created_at': row['created_at'],
+                'updated_at': row['updated_at'],
+                'claimed': row['claimed'],
+                'pitch_data': first_mention,
+            })
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'pitches': pitches_list,
             'pagination': {
                 'has_next': page_obj.has_next(),
                 'has_previous': page_obj.has_previous(),
-                'page_number': page_obj.number,
-                'num_pages': paginator.num_pages,
-                'count': paginator.count,
+                'next_cursor': page_obj.next_cursor,
             }
         })
     
-    # Regular HTML response
+    # Regular HTML response: the first page, infinite scroll continues from next_cursor
+    page_obj = cursor_paginate(pitches_qs.select_related('category'), CREATED_ORDERING, per_page=20)
+    
     return render(request, 'pitches/pitches.html', {
         'current_page': current_page,
         'pitches': page_obj,
+        'next_cursor': page_obj.next_cursor,
         'action': action
     })
 
 
 #Site SEO optimized home page
+@cache_anonymous_page
 def home(request):
     current_page = 'home'
     top_pitches = Pitch.objects.all().order_by('-rank')[:9]
@@ -182,19 +176,15 @@ def home(request):
     return render(request, 'index.html', context)
 
 #Categories View
+@cache_anonymous_page
 def categories(request):
     """
     Display all categories with their respective pitches.
     """
     current_page = 'categories'
-    # Get all distinct categories
-    categories = Pitch.objects.values_list('category', flat=True).distinct()
-    
-    # Get pitches for each category
-    category_pitches = {}
-    for category in categories:
-        pitches = Pitch.objects.filter(category=category).order_by('-rank')[:5]
-        category_pitches[category] = pitches
+    # Categories with their top five pitches, from one cached window-function query
+    categories = cached_top_pitches_by_category(per_category=5)
+    category_pitches = {category.id: category.top_pitches for category in categories}
     
     return render(request, 'pitches/categories/categories.html', {
         'categories': categories,
@@ -203,6 +193,7 @@ def categories(request):
     })
 
 # Category Detail View
+@cache_anonymous_page
 def category_detail(request, slug):
     """
     Display pitches filtered by category.
@@ -210,41 +201,41 @@ def category_detail(request, slug):
     current_page = 'category detail'
     category = get_object_or_404(Category, slug=slug)
     # Get pitches in the specified category
-    pitches = Pitch.objects.filter(category=category).order_by('-rank')
+    pitches = Pitch.objects.filter(category=category).select_related('category')
     
-    # Pagination for category pitches
-    paginator = Paginator(pitches, 20)  # Show 20 pitches per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination on (rank, id), 20 pitches per page
+    try:
+        page_obj = cursor_paginate(pitches, RANK_ORDERING, cursor=request.GET.get('cursor'), per_page=20)
+    except InvalidCursor:
+        page_obj = cursor_paginate(pitches, RANK_ORDERING, per_page=20)
     
     return render(request, 'pitches/categories/category_detail.html', {
         'current_page': current_page,
         'pitches': page_obj,
+        'next_cursor': page_obj.next_cursor,
         'category_name': category.name,
     })
 
 
+@cache_anonymous_page
 def leaderboard(request):
     """
     Display a leaderboard of top pitches based on their rank with infinite scroll support.
     """
     current_page = 'leaderboard'
-    # Get page number from request, default to 1
-    page = request.GET.get('page', 1)
-    
-    # Get all pitches ordered by rank
-    pitches = Pitch.objects.all().order_by('-rank')
-    
-    # Pagination - 10 items per page
-    paginator = Paginator(pitches, 20)
+    # ?sort=trending orders by the precomputed time-decayed score
+    sort = 'trending' if request.GET.get('sort') == 'trending' else 'rank'
+    ordering = TRENDING_ORDERING if sort == 'trending' else RANK_ORDERING
     
+    # Keyset pagination on (rank, id) or (trending_score, id), both served from their indexes
+    pitches = Pitch.objects.select_related('category')
     try:
-        page_obj = paginator.page(page)
-    except:
-        page_obj = paginator.page(1)
+        page_obj = cursor_paginate(pitches, ordering, cursor=request.GET.get('cursor'), per_page=20)
+    except InvalidCursor:
+        page_obj = cursor_paginate(pitches, ordering, per_page=20)
     
-    # Calculate the starting rank for this page
-    start_rank = (page_obj.number - 1) * paginator.per_page + 1
+    # The cursor carries how many pitches came before this page
+    start_rank = page_obj.offset + 1
     
     # If it's an AJAX request, return JSON
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -258,7 +249,7 @@ def leaderboard(request):
         return JsonResponse({
             'html': html,
             'has_next': page_obj.has_next(),
-            'next_page_number': page_obj.next_page_number() if page_obj.has_next() else None
+            'next_cursor': page_obj.next_cursor,
         })
     
     # Get all categories
@@ -270,111 +261,37 @@ def leaderboard(request):
         'top_pitches': page_obj,
         'categories': categories,
         'start_rank': start_rank,
+        'next_cursor': page_obj.next_cursor,
+        'sort': sort,
             })
 
 
+@cache_anonymous_page
 def detail(request, slug):
     """
     Display detailed information about a specific pitch.
     Optimized for SEO with rich metadata and structured data.
     """
     # Get the pitch by slug or return a 404 if not found
-    pitch = get_object_or_404(Pitch, slug=slug)
-    
-    # Extract engagement data from pitch_data JSON field
-    engagement_data = {}
-    source_data = {}
+    pitch = get_object_or_404(Pitch.objects.select_related('category'), slug=slug)
     
-    if pitch.pitch_data and isinstance(pitch.pitch_data, list) and len(pitch.pitch_data) > 0:
-        first_entry = pitch.pitch_data[0]
-        engagement_data = first_entry.get("engagement", {})
-        source_data = {
-            'user': first_entry.get("user", {}),
-            'timestamp': first_entry.get("timestamp", {}),
-            'tweet_text': first_entry.get("tweetText", ""),
-            'reply_link': first_entry.get("replyLink", ""),
-            'links': first_entry.get("links", [])
-        }
+    # Meta, structured data, mentions and related ids are rebuilt only when the pitch changes
+    bundle = get_detail_bundle(pitch)
     
-    # Get related pitches (same category or similar ranking)
-    related_pitches = Pitch.objects.filter(
-        category=pitch.category
-    ).exclude(
-        id=pitch.id
-    ).order_by('rank')[:10]
-    
-    # If not enough related pitches, get some by ranking
-    if related_pitches.count() < 10:
-        additional_pitches = Pitch.objects.exclude(
-            id=pitch.id
-        ).exclude(
-            id__in=[p.id for p in related_pitches]
-        ).order_by('rank')[:10-related_pitches.count()]
-        related_pitches = list(related_pitches) + list(additional_pitches)
-    
-    # Calculate pitch metrics for display
-    total_engagement = sum([
-        engagement_data.get('replies', 0),
-        engagement_data.get('retweets', 0),
-        engagement_data.get('likes', 0)
-    ])
-    
-    # SEO metadata
-    meta_data = {
-        'title': f"{pitch.name} | PitchedLink",
-        'description': pitch.description[:160] if pitch.description else f"Discover {pitch.name}, a trending startup pitch on PitchedLink. View details, rankings, and engagement metrics.",
-        'keywords': f"{pitch.name}, startup pitch, {pitch.category or 'software'}, trending startups, pitch deck",
-        'canonical_url': request.build_absolute_uri(),
-        'og_image': pitch.banner_url or pitch.icon_url,
-        'og_type': 'article',
-        'twitter_card': 'summary_large_image',
-    }
-    
-    # Structured data for rich snippets
-    structured_data = {
-        "@context": "https://schema.org",
-        "@type": "SoftwareApplication",
-        "name": pitch.name,
-        "operatingSystem": "All",
-        "applicationCategory": pitch.category.name or "WebApplication",
-        "description": pitch.description or f"Discover {pitch.name}, a trending SaaS tool.",
-        "url": pitch.url,
-        "image": pitch.banner_url or pitch.icon_url,
-        "aggregateRating": {
-            "@type": "AggregateRating",
-            "ratingValue": min(5, max(1, 5 - (pitch.rank / 20))),
-            "reviewCount": max(1, pitch.clap),
-            "bestRating": 5,
-            "worstRating": 1
-        },
-        "offers": {
-            "@type": "Offer",
-            "price": "0",  # If free trial or unknown, keep 0
-            "priceCurrency": "USD",
-            "availability": "https://schema.org/InStock" if pitch.is_launched else "https://schema.org/PreOrder"
-        },
-        "author": {
-            "@type": "Person",
-            "name": pitch.pitch_data[0]['user'].get('name'),
-            "url": f"https://x.com/{pitch.pitch_data[0]['user'].get('handle')}"
-        },
-        "datePublished": pitch.updated_at.strftime("%Y-%m-%dT%H:%M:%SZ") 
-        
-
-    }
+    # SEO metadata (the canonical URL depends on the request)
+    meta_data = dict(bundle['meta_data'], canonical_url=request.build_absolute_uri())
     
     context = {
         'pitch': pitch,
-        'engagement_data': engagement_data,
-        'source_data': source_data,
-        'related_pitches': related_pitches,
-        'total_engagement': total_engagement,
+        'engagement_data': bundle['engagement_data'],
+        'source_data': bundle['source_data'],
+        'related_pitches': related_pitches(bundle['related_pitch_ids']),
         'meta_data': meta_data,
-        'structured_data': json.dumps(structured_data),
+        'structured_data': bundle['structured_data'],
         # Extras
         
-        'latest_mention': pitch.get_latest_mention(),
-        'total_engagement': pitch.get_engagement_data(),
+        'latest_mention': bundle['latest_mention'],
+        'total_engagement': bundle['total_engagement'],
     }
     
     return render(request, 'pitches/detail.html', context)
@@ -388,15 +305,17 @@ def clap_pitch(request, slug):
         clap_count = max(1, int(data.get('clap_count', 1)))
 
         pitch = get_object_or_404(Pitch, slug=slug)
-        pitch.add_clap(user=request.user, clap_count=clap_count)
-
-        # 👉 Show raw claps in UI — feels better
-        display_claps = pitch.get_clap_count()
+        if getattr(settings, 'CLAP_BUFFER_ENABLED', False):
+            # Answer from the write-behind buffer; claps reach the database on the next flush
+            result = clap_buffer.add(request.user, pitch, clap_count)
+        else:
+            result = pitch.add_clap(user=request.user, clap_count=clap_count)
 
         return JsonResponse({
             'success': True,
-            'display_claps': display_claps,  # 👈 Big number for UI
-            'rank': pitch.rank               # 👈 Real rank (based on effective claps)
+            'display_claps': result['display_claps'],      # 👈 Big number for UI (raw claps)
+            'effective_claps': result['effective_claps'],  # 👈 Claps that count towards rank
+            'rank': result['rank']                         # 👈 Real rank (based on effective claps)
         })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
@@ -172,6 +172,10 @@ LOGGING = {
             'handlers': ['console'],
             'level': 'DEBUG',
         },
+        'app.middleware': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
     },
 }
 
@@ -183,6 +187,7 @@ CLOUDINARY_STORAGE = {
             'API_SECRET': config('CLOUDINARY_API_SECRET'),
         } 
 MIDDLEWARE = [    
+    'app.middleware.QueryBudgetMiddleware',  # inactive unless QUERY_BUDGET_ENABLED
     'django_user_agents.middleware.UserAgentMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -223,6 +228,22 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'pitchedlink.wsgi.application'
 
+# Local memory by default; set CACHE_DIR to share the cache between worker processes on disk
+CACHE_DIR = config('CACHE_DIR', default='')
+if CACHE_DIR:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 if LOCAL:
     DATABASES = {
         'default': {
@@ -289,3 +310,65 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # User Agent Cache Backend Configuration
 USER_AGENTS_CACHE = 'default'
+
+# Trending leaderboard: a mention's weight halves every TRENDING_HALF_LIFE_HOURS
+TRENDING_HALF_LIFE_HOURS = 48
+
+# Clap write-behind buffer: claps are batched in memory and flushed every
+# CLAP_BUFFER_FLUSH_MS milliseconds or CLAP_BUFFER_MAX_EVENTS claps. Pending claps live in
+# one worker's memory and are lost if it is killed, so it is opt-in
+CLAP_BUFFER_ENABLED = config('CLAP_BUFFER_ENABLED', default=False, cast=bool)
+CLAP_BUFFER_FLUSH_MS = 500
+CLAP_BUFFER_MAX_EVENTS = 50
+
+# Onboarding claim matching: more matches than this are claimed in a background thread
+CLAIM_MATCH_SYNC_LIMIT = 500
+
+# Query budgets: QueryBudgetMiddleware (opt-in) and the check_query_budgets command
+# report views running more queries than QUERY_BUDGETS[view_name] (else
+# QUERY_BUDGET_DEFAULT) or repeating one statement more than QUERY_BUDGET_MAX_DUPLICATES times
+QUERY_BUDGET_ENABLED = config('QUERY_BUDGET_ENABLED', default=False, cast=bool)
+QUERY_BUDGET_RAISE = config('QUERY_BUDGET_RAISE', default=False, cast=bool)
+QUERY_BUDGET_DEFAULT = 20
+QUERY_BUDGET_MAX_DUPLICATES = 3
+QUERY_BUDGETS = {
+    'index': 10,
+    'pitches': 8,
+    'leaderboard': 6,
+    'detail': 10,
+    'categories': 5,
+    'category_detail': 6,
+    'dashboard': 12,
+    'sitemap': 6,
+}
+
+# Categories page, navigation categories and featured pitches: cached for up to this many seconds,
+# invalidated early when ranks or categories change. Invalidation bumps a version kept in the
+# default cache, which LocMemCache keeps per process: other workers would go on serving the old
+# listings until they time out. So, like PAGE_CACHE_ENABLED, this is on by default only with a
+# shared cache (CACHE_DIR); enable it explicitly for Redis/Memcached or a single worker
+LISTING_CACHE_ENABLED = config('LISTING_CACHE_ENABLED', default=bool(CACHE_DIR), cast=bool)
+CATEGORIES_CACHE_TIMEOUT = 300
+FEATURED_CACHE_TIMEOUT = 300
+
+# device_context: parsed User-Agents kept in an LRU of this size; is_mobile read from Sec-CH-UA-Mobile when sent
+DEVICE_CACHE_SIZE = 512
+DEVICE_USE_CLIENT_HINTS = True
+
+# Anonymous page cache: fresh for PAGE_CACHE_TIMEOUT seconds, then served stale for up to
+# PAGE_CACHE_STALE_TIMEOUT more while one request re-renders it. Needs a cache shared by all
+# workers, like LISTING_CACHE_ENABLED
+PAGE_CACHE_ENABLED = config('PAGE_CACHE_ENABLED', default=bool(CACHE_DIR), cast=bool)
+PAGE_CACHE_TIMEOUT = 60
+PAGE_CACHE_STALE_TIMEOUT = 600
+PAGE_CACHE_LOCK_TIMEOUT = 30
+
+# Detail page bundles are keyed by the pitch's updated_at/rank/clap; this only bounds their lifetime
+DETAIL_BUNDLE_TIMEOUT = 3600
+
+# Shared on-disk cache for the site scrapers (metadata, categorizer, redirect resolution).
+# Entries without Cache-Control/Expires stay fresh for HTTP_CACHE_TTL seconds, then are revalidated
+HTTP_CACHE_ENABLED = config('HTTP_CACHE_ENABLED', default=True, cast=bool)
+HTTP_CACHE_PATH = config('HTTP_CACHE_PATH', default=str(BASE_DIR / 'http_cache.sqlite3'))
+HTTP_CACHE_MAX_BYTES = 256 * 1024 * 1024
+HTTP_CACHE_TTL = 6 * 3600